@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""A local content-addressed compiler cache.
+
+The CompilerCache feature prefixes the SCons compile commands with
+
+  python build/compilecache.py --cache-dir=DIR --stats=FILE -- g++ ...
+
+The compiler is first run with -E. The object file is looked up under the
+SHA-1 of the preprocessed source, the remaining arguments and the compiler's
+identity (resolved path, size and mtime). Since the key covers the
+preprocessed source, new BUILD_FLAGS in build.h only invalidate the files
+that actually include it, and __DATE__/__TIME__ are part of the key as well.
+The revision only ends up in the generated buildinfo.cpp, which is missed
+once per commit. With -g the debug info records the working directory, so
+it is part of the key too. clang's -E output doesn't contain the headers of
+an -include-pch PCH, so the digest of the PCH is added. With -gsplit-dwarf
+the .dwo file next to the object file is cached along with it.
+
+Each compile appends "hit" or "miss" to FILE; summarize_stats() reads it.
+"""
+
+from __future__ import print_function
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+
+SOURCE_SUFFIXES = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.C')
+
+
+def find_program(program):
+    if os.path.dirname(program):
+        return os.path.abspath(program)
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        candidate = os.path.join(path, program)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def compiler_identity(compiler):
+    path = find_program(compiler)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return '%s:%d:%d' % (path, stat.st_size, int(stat.st_mtime))
+
+
+def parse_command(command):
+    """Returns the output file, the source file and the arguments without
+    the two, or None if command isn't a single source compile."""
+    if '-c' not in command[1:]:
+        return None
+    output = None
+    sources = []
+    arguments = []
+    args = iter(command[1:])
+    for arg in args:
+        if arg == '-o':
+            output = next(args, None)
+        elif arg.startswith('-o') and len(arg) > 2:
+            output = arg[2:]
+        elif not arg.startswith('-') and arg.endswith(SOURCE_SUFFIXES):
+            sources.append(arg)
+        else:
+            arguments.append(arg)
+    if output is None or len(sources) != 1:
+        return None
+    return output, sources[0], arguments
+
+
+def split_dwarf_file(output, arguments):
+    """Returns the .dwo file -gsplit-dwarf writes for output, or None."""
+    if '-gsplit-dwarf' not in arguments:
+        return None
+    return os.path.splitext(output)[0] + '.dwo'
+
+
+def precompiled_header_digest(cache_dir, arguments):
+    """Returns the SHA-1 of the PCH passed with -include-pch, or None. The
+    digest is kept in cache_dir by the path, size and mtime of the PCH, so the
+    PCH is only hashed once per build of it."""
+    if '-include-pch' not in arguments[:-1]:
+        return None
+    path = arguments[arguments.index('-include-pch') + 1]
+    stat = os.stat(path)
+    # SCons removes the PCH before rebuilding it, so the inode changes too.
+    identity = '%s:%d:%r:%d' % (os.path.abspath(path), stat.st_size,
+                                stat.st_mtime, stat.st_ino)
+    digest_file = os.path.join(
+        cache_dir, 'pch', hashlib.sha1(identity.encode('utf-8')).hexdigest())
+    if os.path.isfile(digest_file):
+        with open(digest_file, 'rb') as f:
+            return f.read().decode('ascii')
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    if not os.path.isdir(os.path.dirname(digest_file)):
+        try:
+            os.makedirs(os.path.dirname(digest_file))
+        except OSError:
+            # Created by a parallel job.
+            pass
+    write_atomically(digest_file, digest.hexdigest().encode('ascii'))
+    return digest.hexdigest()
+
+
+def run(command):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+
+# This script runs outside of SCons and can't import build/util.py, so these
+# two follow util.write_atomically(). Each compile runs its own single
+# threaded process, so the pid is enough to keep the temporary files apart.
+def write_atomically(path, data):
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+
+def copy_atomically(source, path):
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    shutil.copyfile(source, temp_path)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+
+def record(stats_file, result):
+    if stats_file is None:
+        return
+    # Appends of a few bytes are atomic, so parallel jobs can share the file.
+    fd = os.open(stats_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (result + '\n').encode('ascii'))
+    finally:
+        os.close(fd)
+
+
+def get_stdio(stream):
+    return getattr(stream, 'buffer', stream)
+
+
+def cached_compile(cache_dir, stats_file, command):
+    parsed = parse_command(command)
+    identity = compiler_identity(command[0])
+    if parsed is None or identity is None:
+        record(stats_file, 'uncacheable')
+        return subprocess.call(command)
+    output, source, arguments = parsed
+
+    code, preprocessed, _ = run([command[0], '-E'] + arguments + [source])
+    if code != 0:
+        # Let the real compile report the error.
+        record(stats_file, 'uncacheable')
+        return subprocess.call(command)
+
+    digest = hashlib.sha1()
+    for part in [identity] + arguments:
+        digest.update(part.encode('utf-8') + b'\0')
+    if any(arg.startswith('-g') and arg != '-g0' for arg in arguments):
+        digest.update(os.getcwd().encode('utf-8') + b'\0')
+    pch_digest = precompiled_header_digest(cache_dir, arguments)
+    if pch_digest is not None:
+        digest.update(pch_digest.encode('ascii') + b'\0')
+    digest.update(preprocessed)
+    key = digest.hexdigest()
+
+    entry_dir = os.path.join(cache_dir, key[:2])
+    object_file = os.path.join(entry_dir, key[2:] + '.o')
+    stderr_file = os.path.join(entry_dir, key[2:] + '.stderr')
+    dwo_output = split_dwarf_file(output, arguments)
+    dwo_file = os.path.join(entry_dir, key[2:] + '.dwo')
+    if os.path.isfile(object_file) and (dwo_output is None or
+                                        os.path.isfile(dwo_file)):
+        copy_atomically(object_file, output)
+        if dwo_output is not None:
+            copy_atomically(dwo_file, dwo_output)
+        if os.path.isfile(stderr_file):
+            with open(stderr_file, 'rb') as f:
+                get_stdio(sys.stderr).write(f.read())
+        record(stats_file, 'hit')
+        return 0
+
+    code, stdout, stderr = run(command)
+    get_stdio(sys.stdout).write(stdout)
+    get_stdio(sys.stderr).write(stderr)
+    if code == 0 and os.path.isfile(output):
+        if not os.path.isdir(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                # Created by a parallel job.
+                pass
+        write_atomically(stderr_file, stderr)
+        if dwo_output is not None and os.path.isfile(dwo_output):
+            copy_atomically(dwo_output, dwo_file)
+        copy_atomically(output, object_file)
+    record(stats_file, 'miss')
+    return code
+
+
+def summarize_stats(stats_file):
+    """Returns a one line summary of stats_file, or None if no compiles were
+    recorded."""
+    if not os.path.isfile(stats_file):
+        return None
+    counts = {'hit': 0, 'miss': 0, 'uncacheable': 0}
+    with open(stats_file) as f:
+        for line in f:
+            result = line.strip()
+            counts[result] = counts.get(result, 0) + 1
+    total = counts['hit'] + counts['miss']
+    if total + counts['uncacheable'] == 0:
+        return None
+    return '%d hits, %d misses (%.1f%% hit rate), %d uncacheable' % (
+        counts['hit'], counts['miss'],
+        100.0 * counts['hit'] / total if total else 0.0,
+        counts['uncacheable'])
+
+
+def main(argv):
+    cache_dir = None
+    stats_file = None
+    while argv and argv[0] != '--':
+        arg = argv.pop(0)
+        if arg.startswith('--cache-dir='):
+            cache_dir = arg[len('--cache-dir='):]
+        elif arg.startswith('--stats='):
+            stats_file = arg[len('--stats='):] or None
+        else:
+            print('compilecache.py: unknown option %s' % arg, file=sys.stderr)
+            return 2
+    command = argv[1:]
+    if not command or cache_dir is None:
+        print('usage: compilecache.py --cache-dir=DIR [--stats=FILE] -- '
+              'COMPILER ARGS...', file=sys.stderr)
+        return 2
+    return cached_compile(cache_dir, stats_file, command)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
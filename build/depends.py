@@ -8,12 +8,15 @@ import SCons.Script as SCons
 
 class PortAudio(Dependence):
 
+    def pkg_config_packages(self, build):
+        return ['portaudio-2.0'] if build.platform_is_linux else []
+
     def configure(self, build, conf):
         if not conf.CheckLib('portaudio'):
             raise Exception(
                 'Did not find libportaudio.a, portaudio.lib, or the PortAudio-v19 development header files.')
         elif build.platform_is_linux:
-            build.env.ParseConfig('pkg-config portaudio-2.0 --silence-errors --cflags --libs')
+            util.parse_pkg_config(build.env, 'portaudio-2.0')
 
         if build.platform_is_windows and build.static_dependencies:
             conf.CheckLib('advapi32')
@@ -102,11 +105,13 @@ class IOKit(Dependence):
 
 class UPower(Dependence):
     """UPower is used to get battery measurements on Linux."""
+    def pkg_config_packages(self, build):
+        return ['upower-glib'] if build.platform_is_linux else []
+
     def configure(self, build, conf):
         if not build.platform_is_linux:
             return
-        build.env.ParseConfig(
-                'pkg-config upower-glib --silence-errors --cflags --libs')
+        util.parse_pkg_config(build.env, 'upower-glib')
 
 class OggVorbis(Dependence):
 
@@ -199,17 +204,10 @@ class Qt(Dependence):
         # Try pkg-config on Linux
         import sys
         if sys.platform.startswith('linux'):
-            if any(os.access(os.path.join(path, 'pkg-config'), os.X_OK) for path in os.environ["PATH"].split(os.pathsep)):
-                import subprocess
-                try:
-                    if qt5:
-                        qtcore = "Qt5Core"
-                    else:
-                        qtcore = "QtCore"
-                    core = subprocess.Popen(["pkg-config", "--variable=libdir", qtcore], stdout = subprocess.PIPE).communicate()[0].rstrip().decode()
-                finally:
-                    if os.path.isdir(core):
-                        return core
+            qtcore = "Qt5Core" if qt5 else "QtCore"
+            core = util.get_pkg_config().variable(qtcore, 'libdir')
+            if core and os.path.isdir(core):
+                return core
 
         for d in (os.path.join(qtdir, x) for x in ['', 'Frameworks', 'lib']):
             core = os.path.join(d, 'QtCore.framework')
@@ -263,6 +261,11 @@ class Qt(Dependence):
     def satisfy(self):
         pass
 
+    def pkg_config_packages(self, build):
+        if not build.platform_is_linux:
+            return []
+        return ['Qt5Core' if Qt.qt5_enabled(build) else 'QtCore']
+
     def configure(self, build, conf):
         qt_modules = Qt.enabled_modules(build)
 
@@ -572,6 +575,9 @@ class SoundTouch(Dependence):
         else:
             return ['engine/enginebufferscalest.cpp']
 
+    def pkg_config_packages(self, build):
+        return ['soundtouch'] if build.platform_is_linux else []
+
     def configure(self, build, conf, env=None):
         if env is None:
             env = build.env
@@ -580,8 +586,7 @@ class SoundTouch(Dependence):
             # Try using system lib
             if conf.CheckForPKG('soundtouch', '2.0.0'):
                 # System Lib found
-                build.env.ParseConfig('pkg-config soundtouch --silence-errors \
-                                      --cflags --libs')
+                util.parse_pkg_config(build.env, 'soundtouch')
                 self.INTERNAL_LINK = False
 
         if self.INTERNAL_LINK:
@@ -667,6 +672,10 @@ class FpClassify(Dependence):
         env = build.env.Clone()
         if '-ffast-math' in env['CCFLAGS']:
                 env['CCFLAGS'].remove('-ffast-math')
+        # The precompiled header was built with -ffast-math. clang refuses to
+        # use it without, so don't use it here.
+        env['_PCHFLAGS'] = ''
+        env['PCH_FILE'] = None
         return env.Object('util/fpclassify.cpp')
 
 class QtScriptByteArray(Dependence):
@@ -703,6 +712,42 @@ class LAME(Dependence):
             raise Exception("Could not find libmp3lame.")
 
 class MixxxCore(Feature):
+    # The Qt UI forms. Sources include the generated header of path/name.ui
+    # as path/ui_name.h.
+    UI_FILES = [
+        'controllers/dlgcontrollerlearning.ui',
+        'controllers/dlgprefcontrollerdlg.ui',
+        'controllers/dlgprefcontrollersdlg.ui',
+        'dialog/dlgaboutdlg.ui',
+        'dialog/dlgdevelopertoolsdlg.ui',
+        'library/autodj/dlgautodj.ui',
+        'library/dlganalysis.ui',
+        'library/dlgcoverartfullsize.ui',
+        'library/dlghidden.ui',
+        'library/dlgmissing.ui',
+        'library/dlgtagfetcher.ui',
+        'library/dlgtrackinfo.ui',
+        'library/export/dlgtrackexport.ui',
+        'library/recording/dlgrecording.ui',
+        'preferences/dialog/dlgprefautodjdlg.ui',
+        'preferences/dialog/dlgprefbeatsdlg.ui',
+        'preferences/dialog/dlgprefdeckdlg.ui',
+        'preferences/dialog/dlgprefcrossfaderdlg.ui',
+        'preferences/dialog/dlgpreflv2dlg.ui',
+        'preferences/dialog/dlgprefeffectsdlg.ui',
+        'preferences/dialog/dlgprefeqdlg.ui',
+        'preferences/dialog/dlgpreferencesdlg.ui',
+        'preferences/dialog/dlgprefinterfacedlg.ui',
+        'preferences/dialog/dlgprefkeydlg.ui',
+        'preferences/dialog/dlgpreflibrarydlg.ui',
+        'preferences/dialog/dlgprefnovinyldlg.ui',
+        'preferences/dialog/dlgprefrecorddlg.ui',
+        'preferences/dialog/dlgprefreplaygaindlg.ui',
+        'preferences/dialog/dlgprefsounddlg.ui',
+        'preferences/dialog/dlgprefsounditem.ui',
+        'preferences/dialog/dlgprefvinyldlg.ui',
+        'preferences/dialog/dlgprefwaveformdlg.ui',
+    ]
 
     def description(self):
         return "Mixxx Core Features"
@@ -1231,10 +1276,15 @@ class MixxxCore(Feature):
                    "util/autohidpi.cpp",
                    "util/screensaver.cpp",
                    "util/indexrange.cpp",
-
-                   '#res/mixxx.qrc'
                    ]
 
+        if Qt.qt5_enabled(build):
+            # One rcc run per resource directory, so changing an icon only
+            # rebuilds the chunk it is in.
+            sources.extend(build.env.Qrc5Chunks('#res/mixxx.qrc'))
+        else:
+            sources.append('#res/mixxx.qrc')
+
         proto_args = {
             'PROTOCPROTOPATH': ['src'],
             'PROTOCPYTHONOUTDIR': '',  # set to None to not generate python
@@ -1242,48 +1292,19 @@ class MixxxCore(Feature):
             'PROTOCCPPOUTFLAGS': '',
             #'PROTOCCPPOUTFLAGS': "dllexport_decl=PROTOCONFIG_EXPORT:"
         }
+        # One protoc run for all .proto files. It only rewrites the generated
+        # files that changed.
         proto_sources = SCons.Glob('proto/*.proto')
-        proto_objects = [build.env.Protoc([], proto_source, **proto_args)[0]
-                         for proto_source in proto_sources]
+        proto_objects = [node for node in
+                         build.env.Protoc([], proto_sources, **proto_args)
+                         if node.get_suffix() == '.cc']
         sources.extend(proto_objects)
 
         # Uic these guys (they're moc'd automatically after this) - Generates
         # the code for the QT UI forms.
-        ui_files = [
-            'controllers/dlgcontrollerlearning.ui',
-            'controllers/dlgprefcontrollerdlg.ui',
-            'controllers/dlgprefcontrollersdlg.ui',
-            'dialog/dlgaboutdlg.ui',
-            'dialog/dlgdevelopertoolsdlg.ui',
-            'library/autodj/dlgautodj.ui',
-            'library/dlganalysis.ui',
-            'library/dlgcoverartfullsize.ui',
-            'library/dlghidden.ui',
-            'library/dlgmissing.ui',
-            'library/dlgtagfetcher.ui',
-            'library/dlgtrackinfo.ui',
-            'library/export/dlgtrackexport.ui',
-            'library/recording/dlgrecording.ui',
-            'preferences/dialog/dlgprefautodjdlg.ui',
-            'preferences/dialog/dlgprefbeatsdlg.ui',
-            'preferences/dialog/dlgprefdeckdlg.ui',
-            'preferences/dialog/dlgprefcrossfaderdlg.ui',
-            'preferences/dialog/dlgpreflv2dlg.ui',
-            'preferences/dialog/dlgprefeffectsdlg.ui',
-            'preferences/dialog/dlgprefeqdlg.ui',
-            'preferences/dialog/dlgpreferencesdlg.ui',
-            'preferences/dialog/dlgprefinterfacedlg.ui',
-            'preferences/dialog/dlgprefkeydlg.ui',
-            'preferences/dialog/dlgpreflibrarydlg.ui',
-            'preferences/dialog/dlgprefnovinyldlg.ui',
-            'preferences/dialog/dlgprefrecorddlg.ui',
-            'preferences/dialog/dlgprefreplaygaindlg.ui',
-            'preferences/dialog/dlgprefsounddlg.ui',
-            'preferences/dialog/dlgprefsounditem.ui',
-            'preferences/dialog/dlgprefvinyldlg.ui',
-            'preferences/dialog/dlgprefwaveformdlg.ui',
-        ]
-        map(Qt.uic(build), ui_files)
+        uic = Qt.uic(build)
+        for ui_file in self.UI_FILES:
+            uic(ui_file)
 
         if build.platform_is_windows:
             # Add Windows resource file with icons and such
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import atexit
+import hashlib
 import os
+import pickle
+import sys
 from . import util
 from .mixxx import Feature
 import SCons.Script as SCons
@@ -79,6 +83,9 @@ class HID(Feature):
     def add_options(self, build, vars):
         vars.Add('hid', 'Set to 1 to enable HID controller support.', 1)
 
+    def pkg_config_packages(self, build):
+        return ['hidapi-libusb', 'libusb-1.0'] if build.platform_is_linux else []
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
@@ -88,14 +95,13 @@ class HID(Feature):
             if not conf.CheckLib(['hidapi-libusb', 'libhidapi-libusb']):
                 # No System Lib found
                 self.INTERNAL_LINK = True
-                build.env.ParseConfig(
-                    'pkg-config libusb-1.0 --silence-errors --cflags --libs')
+                util.parse_pkg_config(build.env, 'libusb-1.0')
                 if (not conf.CheckLib(['libusb-1.0', 'usb-1.0']) or
                         not conf.CheckHeader('libusb-1.0/libusb.h')):
                     raise Exception(
                            'Did not find the libusb 1.0 development library or its header file')
             else:
-                build.env.ParseConfig('pkg-config hidapi-libusb --silence-errors --cflags --libs')
+                util.parse_pkg_config(build.env, 'hidapi-libusb')
 
 
             # Optionally add libpthread and librt. Some distros need this.
@@ -158,12 +164,14 @@ class Bulk(Feature):
         vars.Add('bulk',
                  'Set to 1 to enable USB Bulk controller support.', is_default)
 
+    def pkg_config_packages(self, build):
+        return ['libusb-1.0']
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
 
-        build.env.ParseConfig(
-            'pkg-config libusb-1.0 --silence-errors --cflags --libs')
+        util.parse_pkg_config(build.env, 'libusb-1.0')
         if (not conf.CheckLib(['libusb-1.0', 'usb-1.0']) or
                 not conf.CheckHeader('libusb-1.0/libusb.h')):
             raise Exception(
@@ -299,6 +307,11 @@ class IPod(Feature):
     def add_options(self, build, vars):
         vars.Add('ipod', 'Set to 1 to enable iPod support through libgpod', 0)
 
+    def pkg_config_packages(self, build):
+        if build.platform_is_linux or build.platform_is_osx:
+            return ['libgpod-1.0', 'glib-2.0']
+        return []
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
@@ -320,10 +333,7 @@ class IPod(Feature):
         if build.platform_is_linux or build.platform_is_osx:
             # env.Append(LIBS = 'libgpod-1.0')
             # env.Append(LIBS = 'glib-2.0')
-            build.env.ParseConfig(
-                'pkg-config libgpod-1.0 --silence-errors --cflags --libs')
-            build.env.ParseConfig(
-                'pkg-config glib-2.0 --silence-errors --cflags --libs')
+            util.parse_pkg_config(build.env, 'libgpod-1.0', 'glib-2.0')
 
     def sources(self, build):
         return ['wipodtracksmodel.cpp']
@@ -389,6 +399,12 @@ class Vamp(Feature):
     def add_options(self, build, vars):
         vars.Add('vamp', 'Set to 1 to enable vamp analysers', 1)
 
+    def pkg_config_packages(self, build):
+        packages = ['vamp-plugin-sdk']
+        if build.platform_is_linux:
+            packages.append('fftw3')
+        return packages
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
@@ -414,8 +430,7 @@ class Vamp(Feature):
         have_fftw3 = conf.CheckLib('fftw3', autoadd=False)
         if have_fftw3_h and have_fftw3 and build.platform_is_linux:
             build.env.Append(CPPDEFINES='HAVE_FFTW3')
-            build.env.ParseConfig(
-                'pkg-config fftw3 --silence-errors --cflags --libs')
+            util.parse_pkg_config(build.env, 'fftw3')
 
     def sources(self, build):
         sources = ['analyzer/vamp/vampanalyzer.cpp',
@@ -711,6 +726,7 @@ class Verbose(Feature):
             build.env['RANLIBCOMSTR'] = '[RANLIB] $TARGET'
             build.env['LDMODULECOMSTR'] = '[LD] $TARGET'
             build.env['LINKCOMSTR'] = '[LD] $TARGET'
+            build.env['PCHCOMSTR'] = '[PCH] $SOURCE'
 
             build.env['QT4_LUPDATECOMSTR'] = '[LUPDATE] $SOURCE'
             build.env['QT4_LRELEASECOMSTR'] = '[LRELEASE] $SOURCE'
@@ -726,6 +742,320 @@ class Verbose(Feature):
             build.env['QT5_MOCCOMSTR'] = '[MOC] $SOURCE'
 
 
+class CompilerCache(Feature):
+    COMMANDS = ['CCCOM', 'CXXCOM', 'SHCCCOM', 'SHCXXCOM']
+
+    def description(self):
+        return "Compiler cache"
+
+    def enabled(self, build):
+        build.flags['cache'] = util.get_flags(build.env, 'cache', 0)
+        if int(build.flags['cache']):
+            return True
+        return False
+
+    def add_options(self, build, vars):
+        vars.Add('cache', 'Set to 1 to cache compiled objects in cache_dir.', 0)
+        vars.Add('cache_dir',
+                 'Directory of the compiler cache. Default: cache/compiler', '')
+
+    def cache_dir(self, build):
+        return build.env.get('cache_dir') or SCons.Dir('#cache/compiler').abspath
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        if not build.toolchain_is_gnu:
+            self.status = "Disabled (requires the gnu toolchain)"
+            return
+
+        # See build/compilecache.py for how objects are looked up.
+        build.env['COMPILER_CACHE'] = \
+            '"%s" "%s" --cache-dir="%s" --stats=$COMPILER_CACHE_STATS --' % (
+                sys.executable, SCons.File('#build/compilecache.py').abspath,
+                self.cache_dir(build))
+        build.env['COMPILER_CACHE_STATS'] = ''
+        # $( $) keeps the wrapper out of the build signatures. It doesn't
+        # change the objects, and the stats file is new on every run.
+        for command in CompilerCache.COMMANDS:
+            build.env[command] = '$( $COMPILER_CACHE $) ' + build.env[command]
+        self.status = "Enabled (%s)" % self.cache_dir(build)
+
+    def post_dependency_check_configure(self, build, conf):
+        if not build.toolchain_is_gnu:
+            return
+        # The statistics of this run, printed when SCons exits.
+        stats_dir = os.path.join(self.cache_dir(build), 'stats')
+        if not os.path.isdir(stats_dir):
+            os.makedirs(stats_dir)
+        stats_file = os.path.join(stats_dir, '%d.log' % os.getpid())
+        build.env['COMPILER_CACHE_STATS'] = stats_file
+        for command in CompilerCache.COMMANDS:
+            # 2 is SCons.Subst.SUBST_SIG, the command as the signature sees it.
+            if stats_file in build.env.subst('$' + command, 2):
+                raise Exception("The compiler cache changes the signature of %s, "
+                                "every run would rebuild everything." % command)
+
+        def print_stats():
+            from . import compilecache
+            summary = compilecache.summarize_stats(stats_file)
+            if summary is not None:
+                print("Compiler cache: %s" % summary)
+            if os.path.exists(stats_file):
+                os.remove(stats_file)
+        atexit.register(print_stats)
+
+
+class Unity(Feature):
+    # Sources that are never merged. main.cpp is left out of mixxx-test by
+    # name. See build/unity.py for the sources excluded automatically.
+    EXCLUDE = ['main.cpp']
+
+    def description(self):
+        return "Unity build"
+
+    def enabled(self, build):
+        build.flags['unity'] = util.get_flags(build.env, 'unity', 0)
+        if int(build.flags['unity']) > 1:
+            return True
+        return False
+
+    def add_options(self, build, vars):
+        vars.Add('unity',
+                 'Set to N > 1 to compile the sources of each directory in batches of N files.', 0)
+
+    def group_sources(self, build, sources):
+        """Returns sources with the .cpp files of src/ replaced by the
+        objects of generated unity sources."""
+        from . import unity
+        env = build.env
+        candidates = [source for source in sources
+                      if isinstance(source, str) and source.endswith('.cpp') and
+                      not source.startswith('#') and not os.path.isabs(source) and
+                      source not in Unity.EXCLUDE]
+        batches, excluded = unity.make_batches(
+            SCons.Dir('#src').abspath, candidates, int(build.flags['unity']),
+            util.get_include_graph(env))
+        merged = set()
+        result = []
+        for name, paths in batches:
+            if len(paths) < 2:
+                continue
+            unity_cpp = env.Command(
+                os.path.join('unity', name), env.Value(unity.get_unity_source(paths)),
+                SCons.Action(util.write_value, '[GEN] $TARGET'))
+            unity_object = env.StaticObject(unity_cpp)
+            # Automoc scans the merged sources instead of the unity source.
+            unity_object[0].attributes.unity_sources = [env.File(path)
+                                                        for path in paths]
+            result.extend(unity_object)
+            merged.update(paths)
+        unity_sources = len(result)
+        result.extend(source for source in sources
+                      if not isinstance(source, str) or source not in merged)
+        self.status = "Enabled (%d sources in %d unity sources, %d excluded)" % (
+            len(merged), unity_sources, len(excluded))
+        return result
+
+
+class PrecompiledHeader(Feature):
+    # Included by almost every source in src/. Every change to this list or
+    # to the compile flags rebuilds everything, so only add headers that
+    # rarely change.
+    HEADERS = ['QtGlobal',
+               'QObject',
+               'QString',
+               'QStringList',
+               'QByteArray',
+               'QList',
+               'QVector',
+               'QHash',
+               'QMap',
+               'QSet',
+               'QVariant',
+               'QSharedPointer',
+               'QScopedPointer',
+               'QPointer',
+               'QMutex',
+               'QAtomicInt',
+               'QDebug',
+               'QtDebug',
+               'QDir',
+               'QFileInfo',
+               'QDateTime',
+               'QUrl',
+               'QWidget',
+               'algorithm',
+               'memory',
+               'vector']
+    TIMES_FILE = '#cache/compile_times.pickle'
+
+    def description(self):
+        return "Precompiled header"
+
+    def enabled(self, build):
+        build.flags['pch'] = util.get_flags(build.env, 'pch', 0)
+        build.flags['pch_times'] = util.get_flags(build.env, 'pch_times', 0)
+        if int(build.flags['pch']):
+            return True
+        return False
+
+    def add_options(self, build, vars):
+        vars.Add('pch',
+                 'Set to 1 to precompile the Qt headers included by most sources.', 0)
+        vars.Add('pch_times',
+                 'Set to 1 to record the compile times and report what the '
+                 'precompiled header saves.', 0)
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        if not build.toolchain_is_gnu:
+            self.status = "Disabled (requires gcc or clang)"
+            return
+        self.status = "Enabled (%d headers)" % len(PrecompiledHeader.HEADERS)
+
+    def post_dependency_check_configure(self, build, conf):
+        if not build.toolchain_is_gnu:
+            return
+        env = build.env
+        header = env.Command(
+            'pch/mixxx_pch.h',
+            env.Value(''.join('#include <%s>\n' % name
+                              for name in PrecompiledHeader.HEADERS)),
+            SCons.Action(util.write_value, '[GEN] $TARGET'))
+        # The PCH has to be built with the flags of the sources using it,
+        # otherwise the compiler ignores it.
+        env['PCHCOM'] = '$CXX -x c++-header -o $TARGET -c $CXXFLAGS $CCFLAGS $_CCCOMCOM $SOURCE'
+        if build.compiler_is_clang:
+            pch = env.Command('pch/mixxx_pch.h.pch', header,
+                              SCons.Action('$PCHCOM', '$PCHCOMSTR'))
+            pch_flags = '-include-pch %s' % pch[0].abspath
+        else:
+            pch = env.Command('pch/mixxx_pch.h.gch', header,
+                              SCons.Action('$PCHCOM', '$PCHCOMSTR'))
+            # GCC looks for mixxx_pch.h.gch next to mixxx_pch.h and warns
+            # if it can't use it.
+            pch_flags = '-include %s -Winvalid-pch' % header[0].abspath
+        env['PCH_FILE'] = pch
+        src_dir = SCons.Dir('#src').abspath
+
+        def uses_pch(source, object_env):
+            # Only the Mixxx sources of src/, and only if they are built with
+            # the flags of the PCH. Clones with other flags, like
+            # fpclassify.cpp without -ffast-math, don't use it.
+            if not source or not object_env.get('PCH_FILE'):
+                return False
+            path = source[0].srcnode().abspath
+            if not path.startswith(src_dir + os.sep):
+                return False
+            return all(object_env.subst('$' + name, 2) == env.subst('$' + name, 2)
+                       for name in ('CCFLAGS', '_CPPDEFFLAGS'))
+
+        def get_pch_flags(target, source, env, for_signature):
+            return pch_flags if uses_pch(source, env) else ''
+        env['_PCHFLAGS'] = get_pch_flags
+        # Only static objects use the PCH. Shared objects like the vamp
+        # plugins are built with -fPIC, which the PCH isn't.
+        if '$CXXFLAGS' not in env['CXXCOM']:
+            raise Exception('Unable to add the precompiled header to CXXCOM: %s'
+                            % env['CXXCOM'])
+        env['CXXCOM'] = env['CXXCOM'].replace('$CXXFLAGS', '$CXXFLAGS $_PCHFLAGS', 1)
+
+        def add_pch_dependency(target, source, env):
+            if uses_pch(source, env):
+                env.Depends(target, env['PCH_FILE'])
+            return target, source
+
+        # Every C++ object using the PCH, including the ones automoc adds for
+        # moc_*.cpp, depends on it.
+        emitters = env['BUILDERS']['StaticObject'].emitter
+        for suffix in ('.cpp', '.cc', '.cxx'):
+            emitter = emitters.get(suffix)
+            if emitter is not None:
+                emitters[suffix] = chain_emitters(emitter, add_pch_dependency)
+
+    @staticmethod
+    def rank_headers(graph, paths):
+        """Returns the headers paths include with angle brackets as a list of
+        (header, number of paths including it), most included first. graph
+        is the include graph of the qt5 tool."""
+        counts = {}
+        for path in paths:
+            for header in set(graph.system_includes(path)):
+                counts[header] = counts.get(header, 0) + 1
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def record_compile_times(self, build, timer):
+        """Stores the compile times of timer, a util.CompileTimer, and prints
+        the time the PCH saves per directory once there are compile times
+        with and without it."""
+        if not timer.times:
+            return
+        times_file = SCons.File(PrecompiledHeader.TIMES_FILE).abspath
+        try:
+            with open(times_file, 'rb') as f:
+                times = pickle.load(f)
+        except Exception:
+            times = {}
+        mode = 'pch' if build.feature_enabled(PrecompiledHeader) else 'no pch'
+        times.setdefault(mode, {}).update(timer.times)
+        with open(times_file, 'wb') as f:
+            pickle.dump(times, f, 2)
+
+        with_pch = times.get('pch', {})
+        without_pch = times.get('no pch', {})
+        by_directory = {}
+        for source in set(with_pch) & set(without_pch):
+            directory = os.path.dirname(source)
+            before, after = by_directory.get(directory, (0.0, 0.0))
+            by_directory[directory] = (before + without_pch[source],
+                                       after + with_pch[source])
+        if not by_directory:
+            return
+        by_directory['Total'] = (
+            sum(before for before, _ in by_directory.values()),
+            sum(after for _, after in by_directory.values()))
+        print("Compile time without and with the PCH:")
+        for directory in sorted(by_directory, key=lambda d: (d == 'Total', d)):
+            before, after = by_directory[directory]
+            print("%035s... %7.1fs %7.1fs (%+.0f%%)" % (
+                directory, before, after,
+                100.0 * (after - before) / before if before else 0.0))
+
+
+def chain_emitters(emitter, next_emitter):
+    def emit(target, source, env):
+        target, source = emitter(target, source, env)
+        return next_emitter(target, source, env)
+    return emit
+
+
+class QtTrace(Feature):
+    def description(self):
+        return "Automoc and moc trace"
+
+    def enabled(self, build):
+        build.flags['qt_trace'] = util.get_flags(build.env, 'qt_trace', 0)
+        if int(build.flags['qt_trace']):
+            return True
+        return False
+
+    def add_options(self, build, vars):
+        vars.Add('qt_trace',
+                 'Set to 1 to trace the automoc scans and moc runs to cache/qt5_trace.json and print the slowest moc runs.', 0)
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        if not depends.Qt.qt5_enabled(build):
+            self.status = "Disabled (requires Qt 5)"
+            return
+        trace_file = os.path.join(build.get_cache_dir(), 'qt5_trace.json')
+        build.env['QT5_TRACEFILE'] = trace_file
+        self.status = "Enabled (%s)" % trace_file
+
+
 class Profiling(Feature):
     def description(self):
         return "profiling (e.g. gprof) support"
@@ -757,7 +1087,8 @@ class TestSuite(Feature):
     def enabled(self, build):
         build.flags['test'] = (util.get_flags(build.env, 'test', 0) or
                                'test' in SCons.COMMAND_LINE_TARGETS or
-                               'mixxx-test' in SCons.COMMAND_LINE_TARGETS)
+                               'mixxx-test' in SCons.COMMAND_LINE_TARGETS or
+                               'pgo-train' in SCons.COMMAND_LINE_TARGETS)
         if int(build.flags['test']):
             return True
         return False
@@ -780,6 +1111,10 @@ class TestSuite(Feature):
         if build.toolchain_is_gnu:
             test_env.Append(CCFLAGS='-pthread')
             test_env.Append(LINKFLAGS='-pthread')
+            # -pthread defines _REENTRANT, which the precompiled header was
+            # built without, so clang would refuse it.
+            test_env['_PCHFLAGS'] = ''
+            test_env['PCH_FILE'] = None
 
         test_env.Append(CPPPATH="#lib/gtest-1.7.0/include")
         gtest_dir = test_env.Dir("#lib/gtest-1.7.0")
@@ -863,6 +1198,11 @@ class Opus(Feature):
         vars.Add('opus', 'Set to 1 to enable Opus (RFC 6716) support \
                            (supported are Opus 1.0 and above and Opusfile 0.2 and above)', 1)
 
+    def pkg_config_packages(self, build):
+        if build.platform_is_linux or build.platform_is_bsd:
+            return ['opusfile', 'opus']
+        return []
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
@@ -882,7 +1222,7 @@ class Opus(Feature):
         build.env.Append(CPPDEFINES='__OPUS__')
 
         if build.platform_is_linux or build.platform_is_bsd:
-            build.env.ParseConfig('pkg-config opusfile opus --silence-errors --cflags --libs')
+            util.parse_pkg_config(build.env, 'opusfile', 'opus')
 
     def sources(self, build):
         return ['sources/soundsourceopus.cpp']
@@ -902,6 +1242,12 @@ class FFMPEG(Feature):
         vars.Add('ffmpeg', 'Set to 1 to enable FFmpeg/Avconv support \
                            (supported FFmpeg 0.11-2.x and Avconv 0.8.x-11.x)', 0)
 
+    def pkg_config_packages(self, build):
+        if build.platform_is_linux or build.platform_is_osx \
+                or build.platform_is_bsd:
+            return ['libavcodec', 'libavformat', 'libavutil']
+        return []
+
     def configure(self, build, conf):
         if not self.enabled(build):
             return
@@ -929,12 +1275,8 @@ class FFMPEG(Feature):
             build.env.Append(CCFLAGS='-D__STDC_FORMAT_MACROS')
 
             # Grabs the libs and cflags for FFmpeg
-            build.env.ParseConfig('pkg-config libavcodec --silence-errors \
-                                  --cflags --libs')
-            build.env.ParseConfig('pkg-config libavformat --silence-errors \
-                                   --cflags --libs')
-            build.env.ParseConfig('pkg-config libavutil --silence-errors \
-                                   --cflags --libs')
+            util.parse_pkg_config(build.env, 'libavcodec', 'libavformat',
+                                  'libavutil')
 
             build.env.Append(CPPDEFINES='__FFMPEGFILE__')
             self.status = "Enabled"
@@ -985,8 +1327,16 @@ class Optimize(Feature):
     LEVEL_NATIVE = 'native'
     LEVEL_LEGACY = 'legacy'
     LEVEL_FASTBUILD = 'fastbuild'
+    LEVEL_PGO = 'pgo'
     LEVEL_DEFAULT = LEVEL_PORTABLE
 
+    # The profile data of optimize=pgo, recorded by "scons pgo-train".
+    PGO_DIR = '#cache/pgo'
+    # The training workload: the engine signal path tests and the
+    # benchmarks of mixxx-test.
+    PGO_TRAINING_TESTS = ['EngineMasterTest.*', 'EngineBufferTest.*',
+                          'EngineBufferE2ETest.*']
+
     def description(self):
         return "Optimization and Tuning"
 
@@ -1016,9 +1366,9 @@ class Optimize(Feature):
 
         if optimize_level not in (Optimize.LEVEL_OFF, Optimize.LEVEL_PORTABLE,
                                   Optimize.LEVEL_NATIVE, Optimize.LEVEL_LEGACY,
-                                  Optimize.LEVEL_FASTBUILD):
+                                  Optimize.LEVEL_FASTBUILD, Optimize.LEVEL_PGO):
             raise Exception("optimize={} is not supported. "
-                            "Use portable, native, legacy or off"
+                            "Use portable, native, legacy, pgo or off"
                             .format(optimize_level))
         return optimize_level
 
@@ -1032,6 +1382,7 @@ class Optimize(Feature):
                         '  portable: sse2 CPU (>= Pentium 4)\n' \
                         '  fastbuild: portable, but without costly optimization steps\n' \
                         '  native: optimized for the CPU of this system\n' \
+                        '  pgo: portable, optimized with the profile recorded by "scons optimize=pgo pgo-train"\n' \
                         '  legacy: pure i386 code' \
                         '  off: no optimization' \
                         , Optimize.LEVEL_DEFAULT)
@@ -1052,6 +1403,8 @@ class Optimize(Feature):
             return
 
         if build.toolchain_is_msvs:
+            if optimize_level == Optimize.LEVEL_PGO:
+                raise Exception("optimize=pgo requires gcc or clang.")
             fastbuild_enabled = optimize_level == Optimize.LEVEL_FASTBUILD
 
             # /GL : http://msdn.microsoft.com/en-us/library/0zza0de8.aspx
@@ -1113,8 +1466,9 @@ class Optimize(Feature):
                 build.env.Append(CPPDEFINES=['__SSE__', '__SSE2__'])
 
         elif build.toolchain_is_gnu:
-            # Portable is fast enough on GNU.
-            if optimize_level == Optimize.LEVEL_FASTBUILD:
+            # Portable is fast enough on GNU. PGO builds portable code, the
+            # profile flags are added by post_dependency_check_configure.
+            if optimize_level in (Optimize.LEVEL_FASTBUILD, Optimize.LEVEL_PGO):
                 optimize_level = Optimize.LEVEL_PORTABLE
 
             # Common flags to all optimizations.
@@ -1132,7 +1486,7 @@ class Optimize(Feature):
             # Clang sanitizers.
             # Note: It is only included in -O on machines where it does not
             # interfere with debugging
-            if not int(build.flags['profiling']) and not Sanitizers().enabled(build):
+            if not int(build.flags['profiling']) and not build.feature_enabled(Sanitizers):
                 build.env.Append(CCFLAGS='-fomit-frame-pointer')
 
             if optimize_level == Optimize.LEVEL_PORTABLE:
@@ -1209,6 +1563,486 @@ class Optimize(Feature):
             # -O3 -fomit-frame-pointer -mtune=native -malign-double
             # -fstrict-aliasing -fno-schedule-insns -ffast-math
 
+    @staticmethod
+    def pgo_profile_files(build):
+        """Returns the profile data files recorded by the training."""
+        suffix = '.profdata' if build.compiler_is_clang else '.gcda'
+        profile_files = []
+        for root, dirs, files in os.walk(SCons.Dir(Optimize.PGO_DIR).abspath):
+            profile_files.extend(os.path.join(root, name) for name in files
+                                 if name.endswith(suffix))
+        return sorted(profile_files)
+
+    def post_dependency_check_configure(self, build, conf):
+        # The PGO flags depend on the profile data, which changes after the
+        # configure results were cached, so they are set on every run.
+        if build.flags['optimize'] != Optimize.LEVEL_PGO or not build.toolchain_is_gnu:
+            return
+        profile_dir = SCons.Dir(Optimize.PGO_DIR).abspath
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+        profile_files = Optimize.pgo_profile_files(build)
+        if build.compiler_is_clang:
+            build.env['LLVM_PROFDATA'] = (build.env.WhereIs('llvm-profdata') or
+                                          'llvm-profdata')
+            build.env['PGO_PROFDATA'] = os.path.join(profile_dir, 'mixxx.profdata')
+
+        if 'pgo-train' in SCons.COMMAND_LINE_TARGETS or not profile_files:
+            build.flags['pgo_phase'] = 'generate'
+            flags = ['-fprofile-generate=%s' % profile_dir]
+            if build.compiler_is_gcc:
+                # The engine runs in several threads.
+                flags.append('-fprofile-update=atomic')
+            build.env.Append(CCFLAGS=flags, LINKFLAGS=flags)
+            self.status = self.build_status(
+                Optimize.LEVEL_PGO, 'instrumented, run "scons optimize=pgo '
+                'pgo-train" and build again to use the profile')
+            return
+
+        build.flags['pgo_phase'] = 'use'
+        if build.compiler_is_clang:
+            flags = ['-fprofile-instr-use=%s' % build.env['PGO_PROFDATA']]
+        else:
+            flags = ['-fprofile-use=%s' % profile_dir, '-fprofile-correction']
+        # The compiler reads the profile behind SCons' back. The digest of it
+        # makes SCons and the compiler cache rebuild everything after a new
+        # training run.
+        digest = hashlib.sha1()
+        for profile_file in profile_files:
+            with open(profile_file, 'rb') as f:
+                digest.update(f.read())
+        build.env.Append(CCFLAGS=flags, LINKFLAGS=flags,
+                         CPPDEFINES=[('MIXXX_PGO_PROFILE', digest.hexdigest()[:12])])
+        self.status = self.build_status(
+            Optimize.LEVEL_PGO, 'using the profile in %s (%d files)' % (
+                Optimize.PGO_DIR, len(profile_files)))
+
+
+class LTO(Feature):
+    MODE_OFF = 'off'
+    MODE_FULL = 'full'
+    MODE_THIN = 'thin'
+
+    def description(self):
+        return "Link-time optimization"
+
+    @staticmethod
+    def get_mode(build):
+        mode = build.env.get('lto', None)
+        if mode is None:
+            mode = SCons.ARGUMENTS.get('lto', LTO.MODE_OFF)
+        mode = str(mode)
+        if mode in ('0', 'none', 'disable', 'disabled'):
+            mode = LTO.MODE_OFF
+        elif mode == '1':
+            mode = LTO.MODE_FULL
+        if mode not in (LTO.MODE_OFF, LTO.MODE_FULL, LTO.MODE_THIN):
+            raise Exception("lto={} is not supported. Use full, thin or off"
+                            .format(mode))
+        return mode
+
+    def enabled(self, build):
+        build.flags['lto'] = LTO.get_mode(build)
+        return build.flags['lto'] != LTO.MODE_OFF
+
+    def add_options(self, build, vars):
+        vars.Add('lto', 'Set to full or thin (clang only) to enable link-time optimization.',
+                 LTO.MODE_OFF)
+        vars.Add('lto_jobs', 'The number of parallel LTO jobs, 0 for one per CPU.', 0)
+
+    @staticmethod
+    def find_tool(build, name):
+        """Returns the LTO aware variant of the archiver tool name ('ar' or
+        'ranlib') that matches the compiler, e.g. gcc-ar-7 for gcc-7 or
+        llvm-ar for clang."""
+        cc = build.env['CC']
+        if build.compiler_is_clang:
+            tool = cc.replace('clang', 'llvm-' + name, 1)
+        else:
+            tool = cc.replace('gcc', 'gcc-' + name, 1)
+        if tool == cc:
+            # CC=cc or a wrapper, the name doesn't tell which tool matches.
+            tool = 'llvm-' + name if build.compiler_is_clang else 'gcc-' + name
+            raise Exception("lto=%s requires %s matching CC=%s." % (
+                build.flags['lto'], tool, cc))
+        path = build.env.WhereIs(tool)
+        if path is None:
+            raise Exception("lto=%s requires %s." % (build.flags['lto'], tool))
+        return path
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        if build.toolchain_is_msvs:
+            self.status = "Disabled (MSVC builds use /GL and /LTCG with optimize)"
+            return
+        if not build.toolchain_is_gnu:
+            self.status = "Disabled (requires gcc or clang)"
+            return
+
+        mode = build.flags['lto']
+        jobs = int(build.env.get('lto_jobs', 0) or 0)
+        if jobs <= 0:
+            import multiprocessing
+            jobs = multiprocessing.cpu_count()
+        # Object files and the static libraries, including gtest, gmock and
+        # benchmark of the test suite, contain compiler IR. The archives need
+        # the LTO plugin to get a symbol index. The macOS tools load libLTO
+        # on their own.
+        if not build.platform_is_osx:
+            build.env['AR'] = LTO.find_tool(build, 'ar')
+            build.env['RANLIB'] = LTO.find_tool(build, 'ranlib')
+
+        if build.compiler_is_gcc:
+            if mode == LTO.MODE_THIN:
+                mode = LTO.MODE_FULL
+                self.status = "full (gcc has no ThinLTO), %d jobs" % jobs
+            else:
+                self.status = "full, %d jobs" % jobs
+            build.env.Append(CCFLAGS='-flto')
+            # gcc partitions the program and optimizes the partitions in
+            # parallel.
+            build.env.Append(LINKFLAGS='-flto=%d' % jobs)
+            return
+
+        flag = '-flto=thin' if mode == LTO.MODE_THIN else '-flto'
+        build.env.Append(CCFLAGS=flag)
+        build.env.Append(LINKFLAGS=flag)
+        if mode == LTO.MODE_FULL:
+            self.status = "full"
+            return
+
+        # ThinLTO optimizes the modules in parallel and caches the results,
+        # so a relink only recompiles the modules that changed.
+        cache_dir = os.path.join(build.get_cache_dir(), 'lto')
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        if build.platform_is_osx:
+            build.env.Append(LINKFLAGS=['-Wl,-cache_path_lto,%s' % cache_dir,
+                                        '-Wl,-mllvm,-threads=%d' % jobs])
+        elif build.env.WhereIs('ld.lld'):
+            build.env.Append(LINKFLAGS=['-fuse-ld=lld',
+                                        '-Wl,--thinlto-jobs=%d' % jobs,
+                                        '-Wl,--thinlto-cache-dir=%s' % cache_dir])
+        else:
+            # The gold linker with the LLVM plugin.
+            build.env.Append(LINKFLAGS=['-Wl,-plugin-opt,jobs=%d' % jobs,
+                                        '-Wl,-plugin-opt,cache-dir=%s' % cache_dir])
+        self.status = "thin, %d jobs, cache in %s" % (jobs, cache_dir)
+
+
+class Multiversion(Feature):
+    # Functions marked with MIXXX_TARGET_CLONES (util/platform.h) are compiled
+    # for each of these instruction sets and the best one is picked at
+    # startup. default is the baseline of the optimize level.
+    TARGETS = ['avx2', 'avx', 'default']
+    TEST_SOURCE = """
+__attribute__((target_clones("avx2", "avx", "default")))
+void scale(float* pBuffer, float gain, int count) {
+    for (int i = 0; i < count; ++i) {
+        pBuffer[i] *= gain;
+    }
+}
+"""
+
+    def description(self):
+        return "Multiversioned SIMD code (AVX/AVX2 with runtime dispatch)"
+
+    def enabled(self, build):
+        build.flags['multiversion'] = util.get_flags(build.env, 'multiversion', 0)
+        return bool(int(build.flags['multiversion']))
+
+    def add_options(self, build, vars):
+        vars.Add('multiversion',
+                 'Set to 1 to compile the sample and mixing functions for AVX and AVX2 '
+                 'as well and pick the variant for the CPU at runtime.', 0)
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        # The dispatch is done with a GNU indirect function, which needs the
+        # glibc dynamic loader.
+        if not (build.toolchain_is_gnu and build.platform_is_linux and
+                build.architecture_is_x86 and build.machine_is_64bit):
+            self.status = "Disabled (requires gcc or clang on x86_64 Linux)"
+            return
+        if Optimize.get_optimization_level(build) == Optimize.LEVEL_NATIVE:
+            self.status = "Disabled (optimize=native already targets this CPU)"
+            return
+        if not conf.TryCompile(Multiversion.TEST_SOURCE, '.cpp'):
+            self.status = "Disabled (the compiler does not support target_clones)"
+            return
+        build.env.Append(CPPDEFINES='MIXXX_MULTIVERSION')
+        self.status = ', '.join(Multiversion.TARGETS)
+
+
+class DebugInfo(Feature):
+    LINKERS = ['default', 'auto', 'bfd', 'gold', 'lld']
+    MODE_DEFAULT = 'default'
+    TIMES_FILE = '#cache/link_times.pickle'
+    TEST_SOURCE = 'int main() { return 0; }\n'
+
+    def description(self):
+        return "Debug info layout and linker"
+
+    @staticmethod
+    def get_linker(build):
+        linker = build.env.get('linker', None)
+        if linker is None:
+            linker = SCons.ARGUMENTS.get('linker', 'default')
+        if linker not in DebugInfo.LINKERS:
+            raise Exception("linker={} is not supported. Use {}"
+                            .format(linker, ', '.join(DebugInfo.LINKERS)))
+        return linker
+
+    def enabled(self, build):
+        for option in ('split_dwarf', 'compress_debug', 'gdb_index', 'link_times'):
+            build.flags[option] = util.get_flags(build.env, option, 0)
+        build.flags['linker'] = DebugInfo.get_linker(build)
+        return (int(build.flags['split_dwarf']) or
+                int(build.flags['compress_debug']) or
+                int(build.flags['gdb_index']) or
+                build.flags['linker'] != 'default')
+
+    def add_options(self, build, vars):
+        vars.Add('split_dwarf',
+                 'Set to 1 to keep the debug info in .dwo files next to the objects '
+                 'instead of linking it into the binaries.', 0)
+        vars.Add('compress_debug', 'Set to 1 to compress the debug sections.', 0)
+        vars.Add('gdb_index',
+                 'Set to 1 to let the linker add a .gdb_index section (gold and lld).', 0)
+        vars.Add('linker', 'Set to auto (lld or gold, whichever works), bfd, gold or lld.',
+                 'default')
+        vars.Add('link_times',
+                 'Set to 1 to record the link times and binary sizes and report '
+                 'them next to the ones of the default debug info.', 0)
+
+    @staticmethod
+    def try_flags(build, conf, **flags):
+        """Appends flags to the environment if a test program still links with
+        them."""
+        saved = dict((key, build.env.get(key, [])[:]) for key in flags)
+        build.env.Append(**flags)
+        if conf.TryLink(DebugInfo.TEST_SOURCE, '.cpp'):
+            return True
+        for key, value in saved.items():
+            build.env[key] = value
+        return False
+
+    def choose_linker(self, build, conf):
+        """Selects the linker and returns its name, or None for the default
+        linker of the compiler."""
+        linker = build.flags['linker']
+        for flag in build.env.get('LINKFLAGS', []):
+            if str(flag).startswith('-fuse-ld='):
+                # Chosen by lto=thin, which depends on it.
+                chosen = str(flag)[len('-fuse-ld='):]
+                if linker not in ('default', 'auto', chosen):
+                    raise Exception("linker=%s conflicts with -fuse-ld=%s in LINKFLAGS"
+                                    % (linker, chosen))
+                return chosen
+        if linker == 'default':
+            return None
+        if linker != 'auto':
+            candidates = [linker]
+        elif build.compiler_is_gcc and build.feature_enabled(LTO):
+            # lld can't load the LTO plugin of gcc.
+            candidates = ['gold']
+        else:
+            candidates = ['lld', 'gold']
+        for candidate in candidates:
+            if (build.env.WhereIs('ld.' + candidate) and
+                    DebugInfo.try_flags(build, conf,
+                                        LINKFLAGS='-fuse-ld=' + candidate)):
+                return candidate
+        if linker != 'auto':
+            raise Exception("linker=%s does not work with %s."
+                            % (linker, build.env['CXX']))
+        return None
+
+    def configure(self, build, conf):
+        if not self.enabled(build):
+            return
+        if not build.toolchain_is_gnu:
+            self.status = "Disabled (requires gcc or clang)"
+            return
+        if build.platform_is_osx:
+            self.status = "Disabled (ld64 leaves the debug info in the object files)"
+            return
+
+        mode = []
+        if int(build.flags['split_dwarf']):
+            # The objects only keep a skeleton with the path of their .dwo
+            # file, so the linker hardly moves any debug info.
+            build.env.Append(CCFLAGS='-gsplit-dwarf')
+            mode.append('split-dwarf')
+        if int(build.flags['compress_debug']):
+            if DebugInfo.try_flags(build, conf, CCFLAGS='-gz',
+                                   LINKFLAGS='-Wl,--compress-debug-sections=zlib'):
+                mode.append('compressed')
+            else:
+                mode.append('not compressed (unsupported)')
+        linker = self.choose_linker(build, conf)
+        if int(build.flags['gdb_index']):
+            # bfd can't build the index. The pubnames sections are what gold
+            # and lld build it from.
+            if linker in ('gold', 'lld') and DebugInfo.try_flags(
+                    build, conf, CCFLAGS='-ggnu-pubnames',
+                    LINKFLAGS='-Wl,--gdb-index'):
+                mode.append('gdb-index')
+            else:
+                mode.append('no gdb-index (requires gold or lld)')
+        if linker is not None:
+            mode.append(linker)
+        build.flags['debug_info'] = ', '.join(mode) or DebugInfo.MODE_DEFAULT
+        self.status = build.flags['debug_info']
+
+    def post_dependency_check_configure(self, build, conf):
+        if (not int(build.flags['split_dwarf']) or not build.toolchain_is_gnu or
+                build.platform_is_osx):
+            return
+        env = build.env
+
+        def add_dwo_side_effect(target, source, env):
+            # The compiler writes foo.dwo next to foo.o. As a side effect
+            # SCons removes it with -c, and a missing one rebuilds the object.
+            # It can't be a target, the programs would link it.
+            for node in target:
+                dwo = node.dir.File(os.path.splitext(node.name)[0] + '.dwo')
+                env.SideEffect(dwo, node)
+                if (os.path.exists(node.abspath) and
+                        not os.path.exists(dwo.abspath)):
+                    env.AlwaysBuild(node)
+            return target, source
+
+        for builder_name in ('StaticObject', 'SharedObject'):
+            emitters = env['BUILDERS'][builder_name].emitter
+            for suffix in ('.c', '.cpp', '.cc', '.cxx'):
+                emitter = emitters.get(suffix)
+                if emitter is not None:
+                    emitters[suffix] = chain_emitters(emitter, add_dwo_side_effect)
+
+    def record_link_times(self, build, timer):
+        """Stores the link times and binary sizes of timer, a util.CompileTimer,
+        and prints them next to the ones of the default debug info once both
+        were recorded."""
+        if not timer.link_times:
+            return
+        times_file = SCons.File(DebugInfo.TIMES_FILE).abspath
+        try:
+            with open(times_file, 'rb') as f:
+                times = pickle.load(f)
+        except Exception:
+            times = {}
+        mode = DebugInfo.MODE_DEFAULT
+        if build.feature_enabled(DebugInfo):
+            mode = build.flags.get('debug_info', DebugInfo.MODE_DEFAULT)
+        times.setdefault(mode, {}).update(timer.link_times)
+        with open(times_file, 'wb') as f:
+            pickle.dump(times, f, 2)
+
+        before = times.get(DebugInfo.MODE_DEFAULT, {})
+        after = times[mode]
+        targets = sorted(set(before) & set(timer.link_times))
+        if mode == DebugInfo.MODE_DEFAULT or not targets:
+            return
+        print("Link time and size with the default debug info and with %s:" % mode)
+        for target in targets:
+            (time_before, size_before), (time_after, size_after) = \
+                before[target], after[target]
+            print("%035s... %7.1fs %7.1fs (%+.0f%%) %7.1fMB %7.1fMB (%+.0f%%)" % (
+                target, time_before, time_after,
+                100.0 * (time_after - time_before) / time_before if time_before else 0.0,
+                size_before / 1048576.0, size_after / 1048576.0,
+                100.0 * (size_after - size_before) / size_before if size_before else 0.0))
+
+
+class CoreLibrary(Feature):
+    MODE_OFF = 'off'
+    MODE_STATIC = 'static'
+    MODE_SHARED = 'shared'
+    NAME = 'mixxx-core'
+
+    def description(self):
+        return "Mixxx core library"
+
+    @staticmethod
+    def get_mode(build):
+        mode = build.env.get('core_library', None)
+        if mode is None:
+            mode = SCons.ARGUMENTS.get('core_library', CoreLibrary.MODE_OFF)
+        mode = str(mode)
+        if mode in ('0', 'none', 'disable', 'disabled'):
+            mode = CoreLibrary.MODE_OFF
+        if mode not in (CoreLibrary.MODE_OFF, CoreLibrary.MODE_STATIC,
+                        CoreLibrary.MODE_SHARED):
+            raise Exception("core_library={} is not supported. Use static, shared or off"
+                            .format(mode))
+        return mode
+
+    def enabled(self, build):
+        build.flags['core_library'] = CoreLibrary.get_mode(build)
+        return build.flags['core_library'] != CoreLibrary.MODE_OFF
+
+    def add_options(self, build, vars):
+        vars.Add('core_library',
+                 'Set to static or shared to build everything but main.cpp as lib%s, '
+                 'which mixxx and mixxx-test both link.' % CoreLibrary.NAME,
+                 CoreLibrary.MODE_OFF)
+
+    def configure(self, build, conf):
+        # The mode the SConscript builds. enabled() resets the requested mode
+        # on every run, so it is kept in a flag of its own.
+        build.flags['core_library_mode'] = CoreLibrary.MODE_OFF
+        if not self.enabled(build):
+            return
+        mode = build.flags['core_library']
+        if mode == CoreLibrary.MODE_SHARED and not (
+                build.toolchain_is_gnu and
+                (build.platform_is_linux or build.platform_is_bsd)):
+            # Windows would need exported symbols and macOS an install name
+            # fixed up in the bundle.
+            mode = CoreLibrary.MODE_STATIC
+            self.status = "static (shared requires gcc or clang on Linux or BSD)"
+        else:
+            self.status = mode
+        build.flags['core_library_mode'] = mode
+        if mode != CoreLibrary.MODE_SHARED:
+            return
+
+        # All objects go into the library, including the ones built with
+        # StaticObject like the unity sources, so all of them need -fPIC.
+        build.env.Append(CCFLAGS='-fPIC')
+        build.env['STATIC_AND_SHARED_OBJECTS_ARE_THE_SAME'] = 1
+        # The library is found next to the binaries in the build directory
+        # and the root, and in LIBDIR/mixxx when installed.
+        lib_dir = build.env.get('LIBDIR', 'lib')
+        if not os.path.isabs(lib_dir):
+            lib_dir = os.path.join('$$ORIGIN', '..', lib_dir)
+        build.env.Append(LINKFLAGS=["-Wl,-rpath,'$$ORIGIN'",
+                                    "-Wl,-rpath,'%s'" % os.path.join(lib_dir, 'mixxx')])
+
+    def build_library(self, build, env, sources):
+        """Builds sources as the core library. Returns the library, the sources
+        and the LINKFLAGS a program needs to link it."""
+        if build.flags['core_library_mode'] == CoreLibrary.MODE_SHARED:
+            library = env.SharedLibrary(
+                CoreLibrary.NAME, sources,
+                SHLINKFLAGS=env['SHLINKFLAGS'] + ['-Wl,-soname,${TARGET.file}'])
+            return library, library, env['LINKFLAGS']
+
+        # Nothing references the qrc resources and the objects that register
+        # themselves in static initializers, so the whole archive is linked.
+        library = env.StaticLibrary(CoreLibrary.NAME, sources)
+        path = library[0].path
+        if build.toolchain_is_msvs:
+            flags = ['/WHOLEARCHIVE:%s' % path]
+        elif build.platform_is_osx:
+            flags = ['-Wl,-force_load,%s' % path]
+        else:
+            flags = ['-Wl,--whole-archive', path, '-Wl,--no-whole-archive']
+        return library, [], env['LINKFLAGS'] + flags
+
 
 class MacAppStoreException(Feature):
     def description(self):
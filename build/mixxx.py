@@ -2,6 +2,7 @@
 
 from __future__ import with_statement
 
+import glob
 import logging
 import platform
 import sys
@@ -12,6 +13,7 @@ import shutil
 import SCons
 from SCons import Script
 
+from . import objectstore
 from . import util
 
 
@@ -19,6 +21,9 @@ class MixxxBuild(object):
 
     def __init__(self, target, machine, build, toolchain, available_features):
         self.available_features = available_features
+        # Feature and Dependence instances by class, see get_feature.
+        self.feature_instances = {}
+        self.feature_enabled_cache = {}
         self.host_platform = self.detect_platform()
         self.host_machine = self.detect_machine()
         self.flags = {}
@@ -161,12 +166,8 @@ class MixxxBuild(object):
 
         # Try fallback to pkg-config on Linux
         if not os.path.isdir(default_qtdir) and self.platform == 'linux':
-            if any(os.access(os.path.join(path, 'pkg-config'), os.X_OK) for path in os.environ["PATH"].split(os.pathsep)):
-                import subprocess
-                try:
-                    default_qtdir = subprocess.Popen(["pkg-config", "--variable=includedir", "Qt5Core"], stdout = subprocess.PIPE).communicate()[0].rstrip().decode()
-                finally:
-                    pass
+            default_qtdir = util.get_pkg_config().variable(
+                'Qt5Core', 'includedir') or default_qtdir
 
         # Ugly hack to check the qtdir argument
         qtdir = Script.ARGUMENTS.get('qtdir',
@@ -217,11 +218,25 @@ class MixxxBuild(object):
             **extra_arguments)
         self.read_environment_variables()
 
+        # Lets automoc skip the sources it scanned in a previous run.
+        self.env['QT5_AUTOMOC_CACHEFILE'] = os.path.join(self.get_cache_dir(),
+                                                         'automoc.cache')
+        # Reuse the output of moc for headers whose tokens didn't change and
+        # the output of uic for unchanged .ui files.
+        self.env['QT5_MOCCACHEDIR'] = os.path.join(self.get_cache_dir(), 'moc')
+        self.env['QT5_UICCACHEDIR'] = os.path.join(self.get_cache_dir(), 'uic')
+        self.env['QT5_LRELEASEMANIFEST'] = os.path.join(self.get_cache_dir(),
+                                                        'lrelease.manifest')
+        # Scan the sources for automoc and run lrelease with as many threads
+        # as scons -j uses.
+        self.env['QT5_AUTOSCAN_JOBS'] = Script.GetOption('num_jobs')
+        self.env['QT5_LRELEASEJOBS'] = Script.GetOption('num_jobs')
+
         # Now that environment variables have been read, we can detect the compiler.
         self.compiler_is_gcc = 'gcc' in self.env['CC']
         self.compiler_is_clang = 'clang' in self.env['CC']
 
-        self.virtualize_build_dir()
+        virtual_build_dir = self.virtualize_build_dir()
 
         if self.toolchain_is_gnu:
             if flags_force32:
@@ -257,6 +272,11 @@ class MixxxBuild(object):
 
         self.install_options()
 
+        # The branch's custom.py is in place now, so the options can be read.
+        self.flags['virtualize_gc'] = int(self.env['virtualize_gc'])
+        if virtual_build_dir is not None and self.flags['virtualize_gc']:
+            self.collect_build_dir_garbage(*virtual_build_dir)
+
     def detect_platform(self):
         if os.name == 'nt' or sys.platform == 'win32':
             return 'windows'
@@ -432,6 +452,9 @@ class MixxxBuild(object):
         vars.Add('prefix', 'Set to your install prefix', '/usr/local')
         vars.Add('virtualize',
                  'Dynamically swap out the build directory when switching Git branches.', 1)
+        vars.Add(Script.BoolVariable(
+            'virtualize_gc',
+            'Remove the stored build dir files that no branch uses anymore.', False))
         vars.Add('qtdir', 'Set to your Qt 5 directory', '/usr/share/qt5')
         vars.Add('qt_sqlite_plugin', 'Set to 1 to package the Qt SQLite plugin.'
                  '\n           Set to 0 if SQLite support is compiled into QtSQL.', 0)
@@ -448,13 +471,13 @@ class MixxxBuild(object):
         vars.Add('sysroot', 'Specify a custom sysroot', '')
         vars.Add('debug_assertions_fatal',
                  'Whether debug assertions are fatal.', False)
+        vars.Add('configure_cache',
+                 'Set to 0 to always re-run the dependency configure checks.', 1)
+        vars.Add('configure_jobs',
+                 'Number of parallel pkg-config queries during configure.', 1)
 
         for feature_class in self.available_features:
-            # Instantiate the feature
-            feature = feature_class()
-
-            # Add the feature to the feature list
-            feature.add_options(self, vars)
+            self.get_feature(feature_class).add_options(self, vars)
 
         vars.Update(self.env)
         Script.Help(vars.GenerateHelpText(self.env))
@@ -463,6 +486,9 @@ class MixxxBuild(object):
         vars.Save(cachefile, self.env)
 
     def virtualize_build_dir(self):
+        """Swaps in the build dir of the current branch. Returns the object
+        store and the branch name, or None if the build dir isn't
+        virtualized."""
         # WARNING: Do not use SCons self.env.SConsignFile to change the location
         # of .sconsign.dblite or turn build_dir into a symlink. It will mostly
         # seem to work fine but eventually cause strange build issues (not
@@ -482,14 +508,20 @@ class MixxxBuild(object):
         # filenames?
         branch_name = re.sub('[/<>|"]', '_', branch_name).lower()
 
+        # The contents of the build dir of every branch are kept in a
+        # content-addressed store shared by all branches. Each branch only
+        # keeps a manifest of its build dir, its .sconsign.dblite and its
+        # custom.py in cache/<branch>.
         cache_dir = self.get_cache_dir()
+        store = objectstore.ObjectStore(os.path.join(cache_dir, 'objects'))
+        manifest_name = self.build_dir + '.manifest'
         branch_build_dir = os.path.join(cache_dir, branch_name)
         virtual_build_dir = os.path.join(branch_build_dir, self.build_dir)
+        virtual_manifest_file = os.path.join(branch_build_dir, manifest_name)
         virtual_sconsign_file = os.path.join(
             branch_build_dir, 'sconsign.dblite')
         virtual_custom_file = os.path.join(branch_build_dir, 'custom.py')
         old_branch_build_dir = ''
-        old_virtual_build_dir = ''
         old_virtual_sconsign_file = ''
         old_virtual_custom_file = ''
 
@@ -513,27 +545,31 @@ class MixxxBuild(object):
         is_branch_different = sconsign_branch != branch_name
         if not is_branch_different:
             # nothing to do
-            return
+            return store, branch_name
 
         print("branch has changed" + sconsign_branch + "->" + branch_name)
 
+        # The manifest of the files currently in the build dir.
+        build_dir_manifest = {}
         if sconsign_branch:
             old_branch_build_dir = os.path.join(cache_dir, sconsign_branch)
-            old_virtual_build_dir = os.path.join(
-                old_branch_build_dir, self.build_dir)
+            old_virtual_manifest_file = os.path.join(
+                old_branch_build_dir, manifest_name)
             old_virtual_sconsign_file = os.path.join(
                 old_branch_build_dir, 'sconsign.dblite')
             old_virtual_custom_file = os.path.join(
                 old_branch_build_dir, 'custom.py')
+            if not os.path.isdir(old_branch_build_dir):
+                os.makedirs(old_branch_build_dir)
             if os.path.isdir(self.build_dir):
-                if os.path.isdir(old_virtual_build_dir):
-                    raise Exception("%s already exists. "
-                                    "build virtualization cannot continue. Please "
-                                    "move or delete it." % old_virtual_build_dir)
-                print("shutil.move" + self.build_dir + old_virtual_build_dir)
-                # move build dir from last build to cache, named with the old
-                # branch name
-                shutil.move(self.build_dir, old_virtual_build_dir)
+                print("checking in " + self.build_dir + " for " +
+                      sconsign_branch)
+                # Only files that changed since the last checkout are hashed.
+                build_dir_manifest = store.check_in(
+                    self.build_dir,
+                    objectstore.load_manifest(old_virtual_manifest_file))
+                objectstore.save_manifest(old_virtual_manifest_file,
+                                          build_dir_manifest)
 
             if os.path.isfile(sconsign_file):
                 print("shutil.move" + sconsign_file + old_virtual_sconsign_file)
@@ -548,17 +584,26 @@ class MixxxBuild(object):
             # all files are saved now so remove .sconsign.branch file
             # to avoid a new copy after an exception below
             os.remove(sconsign_branch_file)
+        elif os.path.isdir(self.build_dir):
+            build_dir_manifest = store.check_in(self.build_dir)
 
-        # Now there should be no folder self.build_dir or file sconsign_file.
+        # Now there should be no file sconsign_file.
         if os.path.isdir(branch_build_dir):
             if os.path.isdir(virtual_build_dir):
-                # found a build_dir in cache from a previous build
-                if os.path.isdir(self.build_dir):
-                    raise Exception('%s exists without a .sconsign.branch file so '
-                                    'build virtualization cannot continue. Please '
-                                    'move or delete it.' % self.build_dir)
-                print("shutil.move" + virtual_build_dir + self.build_dir)
-                shutil.move(virtual_build_dir, self.build_dir)
+                # A build dir saved by the previous way of virtualizing, which
+                # moved the whole directory into the cache.
+                print("checking in " + virtual_build_dir)
+                objectstore.save_manifest(virtual_manifest_file,
+                                          store.check_in(virtual_build_dir))
+                shutil.rmtree(virtual_build_dir)
+            if os.path.isfile(virtual_manifest_file):
+                print("checking out " + self.build_dir + " for " +
+                      branch_name)
+                if not os.path.isdir(self.build_dir):
+                    os.makedirs(self.build_dir)
+                objectstore.save_manifest(virtual_manifest_file, store.check_out(
+                    objectstore.load_manifest(virtual_manifest_file),
+                    self.build_dir, build_dir_manifest))
             if os.path.isfile(virtual_sconsign_file):
                 if os.path.isfile(sconsign_file):
                     raise Exception('%s exists without a .sconsign.branch file so '
@@ -576,41 +621,79 @@ class MixxxBuild(object):
         else:
             # no cached build dir found, assume this is a branch from the old branch
             # if not, no problem because scons will rebuild all changed files in any case
-            # copy the old_virtual_dir back
+            # the build dir is left as it is, copy the old sconsign and custom.py back
             if sconsign_branch:
-                if os.path.isdir(old_virtual_build_dir):
-                    if os.path.isdir(self.build_dir):
-                        raise Exception('%s exists without a .sconsign.branch file so '
-                                        'build virtualization cannot continue. Please '
-                                        'move or delete it.' % self.build_dir)
-                    print("shutil.copytree" + old_virtual_build_dir + self.build_dir)
-                    shutil.copytree(old_virtual_build_dir, self.build_dir)
                 if os.path.isfile(old_virtual_sconsign_file):
                     if os.path.isfile(sconsign_file):
                         raise Exception('%s exists without a .sconsign.branch file so '
                                         'build virtualization cannot continue. Please '
                                         'move or delete it.' % sconsign_file)
-                    print("shutil.copy" + virtual_sconsign_file + sconsign_file)
+                    print("shutil.copy" + old_virtual_sconsign_file + sconsign_file)
                     shutil.copy(old_virtual_sconsign_file, sconsign_file)
                 if os.path.isfile(old_virtual_custom_file):
                     if os.path.isfile(custom_file):
                         raise Exception('%s exists without a .sconsign.branch file so '
                                         'build virtualization cannot continue. Please '
                                         'move or delete it.' % custom_file)
-                    print("shutil.copy" + virtual_custom_file + custom_file)
+                    print("shutil.copy" + old_virtual_custom_file + custom_file)
                     shutil.copy(old_virtual_custom_file, custom_file)
 
-            # create build dir in cache folder for later move
+            # create build dir in cache folder for later use
             print("os.makedirs" + branch_build_dir)
             os.makedirs(branch_build_dir)
+            objectstore.save_manifest(virtual_manifest_file,
+                                      build_dir_manifest)
 
         with open(sconsign_branch_file, 'w+') as f:
             print("touch" + sconsign_branch_file)
             f.write(branch_name)
 
+        return store, branch_name
+
+    def collect_build_dir_garbage(self, store, branch_name):
+        """Removes all objects from the store that no branch references."""
+        cache_dir = self.get_cache_dir()
+        manifest_files = glob.glob(os.path.join(cache_dir, '*', '*.manifest'))
+        # The build dir may contain files that were built since the manifest
+        # of the current branch was written.
+        if os.path.isdir(self.build_dir):
+            manifest_file = os.path.join(cache_dir, branch_name,
+                                         self.build_dir + '.manifest')
+            if os.path.isdir(os.path.dirname(manifest_file)):
+                objectstore.save_manifest(manifest_file, store.check_in(
+                    self.build_dir, objectstore.load_manifest(manifest_file)))
+                if manifest_file not in manifest_files:
+                    manifest_files.append(manifest_file)
+        removed_objects, removed_bytes = store.collect_garbage(manifest_files)
+        print("Removed %d unreferenced objects (%d bytes) from %s" % (
+            removed_objects, removed_bytes, store.path))
+
     def get_features(self):
         return self.available_features
 
+    def get_feature(self, feature_class):
+        """Returns the instance of feature_class (a Feature or Dependence
+        class) shared by all users of this build."""
+        feature = self.feature_instances.get(feature_class)
+        if feature is None:
+            feature = feature_class()
+            self.feature_instances[feature_class] = feature
+        return feature
+
+    def feature_enabled(self, feature_class):
+        """Returns whether feature_class is enabled. The result is cached
+        until invalidate_feature_enabled is called; the flags the feature's
+        enabled() stores are still in self.flags."""
+        if feature_class not in self.feature_enabled_cache:
+            self.feature_enabled_cache[feature_class] = bool(
+                self.get_feature(feature_class).enabled(self))
+        return self.feature_enabled_cache[feature_class]
+
+    def invalidate_feature_enabled(self):
+        # configure() may change the flags enabled() looks at, e.g. Opus
+        # disables itself when libopusfile is missing.
+        self.feature_enabled_cache.clear()
+
 
 class Dependence(object):
 
@@ -627,6 +710,11 @@ class Dependence(object):
     def depends(self, build):
         return []
 
+    def pkg_config_packages(self, build):
+        # The pkg-config packages configure() queries. They are prefetched in
+        # parallel when configure_jobs is greater than 1.
+        return []
+
     def configure(self, build, conf):
         pass
 
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""A content-addressed store for build directories.
+
+MixxxBuild.virtualize_build_dir uses it to keep one build directory per Git
+branch without keeping one copy of every object file per branch. Files are
+stored once under cache/objects/ by the SHA-1 of their content and linked into
+the build directory. A manifest per branch records which object belongs at
+which path, so switching branches only touches the files that differ.
+
+Files are linked with a reflink (copy-on-write clone) where the filesystem
+supports it. Otherwise the outputs of the compiler and the linker are hard
+linked and everything else is copied. A hard link shares the stored object, so
+it is only safe for files nothing writes in place: SCons removes the objects,
+libraries and programs it builds before rebuilding them. Precious targets
+(moc, uic and protoc output) are kept and overwritten, and untracked side
+outputs like the .dwo files of -gsplit-dwarf are rewritten by the compiler, so
+they must not share the stored copy.
+"""
+
+from __future__ import with_statement
+
+import errno
+import glob
+import hashlib
+import os
+import pickle
+import shutil
+
+from . import util
+
+# From linux/fs.h
+FICLONE = 0x40049409
+
+# Built by the compiler or the linker as non-precious SCons targets.
+HARD_LINK_SUFFIXES = ('.o', '.os', '.obj', '.a', '.so', '.lib', '.dll',
+                      '.exe', '.gch', '.pch')
+
+
+def reflink(source, target):
+    """Clones source to target on filesystems that support it (Btrfs, XFS).
+    Raises OSError or IOError otherwise."""
+    import fcntl
+    with open(source, 'rb') as source_file:
+        with open(target, 'wb') as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), FICLONE,
+                            source_file.fileno())
+            except (IOError, OSError):
+                target_file.close()
+                os.remove(target)
+                raise
+    shutil.copystat(source, target)
+
+
+def can_hard_link(path, content_path=None):
+    """Returns whether path is a file SCons removes before rebuilding it: an
+    object file, a library or a program. content_path is where the content of
+    path is if it doesn't exist yet."""
+    name = os.path.basename(path)
+    if name.endswith(HARD_LINK_SUFFIXES):
+        return True
+    content_path = content_path or path
+    return ('.' not in name and os.path.isfile(content_path) and
+            os.access(content_path, os.X_OK))
+
+
+def link_or_copy(source, target, hard_link=True):
+    for method in (reflink, getattr(os, 'link', None) if hard_link else None):
+        if method is None:
+            continue
+        try:
+            method(source, target)
+            return
+        except (IOError, OSError, ImportError):
+            pass
+    shutil.copy2(source, target)
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    """Returns the manifest stored at path or an empty one."""
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
+
+def save_manifest(path, manifest):
+    util.write_atomically(path, pickle.dumps(manifest, 2))
+
+
+class ObjectStore(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def object_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def add(self, path, digest):
+        """Stores the file at path under digest. Files can_hard_link() accepts
+        may share the stored object, all others are copied."""
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            return
+        directory = os.path.dirname(object_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = object_path + '.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        link_or_copy(path, temp_path, can_hard_link(path))
+        os.rename(temp_path, object_path)
+
+    def check_in(self, directory, previous=None):
+        """Adds all files in directory to the store and returns their
+        manifest, a dictionary from relative path to (digest, size, mtime,
+        inode). Files whose size, mtime and inode match previous are not
+        hashed again."""
+        previous = previous or {}
+        manifest = {}
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    continue
+                relative_path = os.path.relpath(path, directory)
+                stat = os.stat(path)
+                entry = previous.get(relative_path)
+                if (entry is not None and
+                        entry[1:] == (stat.st_size, stat.st_mtime,
+                                      stat.st_ino) and
+                        os.path.exists(self.object_path(entry[0]))):
+                    manifest[relative_path] = entry
+                    continue
+                digest = hash_file(path)
+                self.add(path, digest)
+                manifest[relative_path] = (digest, stat.st_size,
+                                           stat.st_mtime, stat.st_ino)
+        return manifest
+
+    def check_out(self, manifest, directory, current):
+        """Makes directory, whose files are described by the manifest
+        current, match manifest. Only files that differ are touched. Returns
+        the manifest of the resulting directory."""
+        result = {}
+        for relative_path, entry in current.items():
+            target_entry = manifest.get(relative_path)
+            if target_entry is None or target_entry[0] != entry[0]:
+                try:
+                    os.remove(os.path.join(directory, relative_path))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+        for relative_path, entry in manifest.items():
+            path = os.path.join(directory, relative_path)
+            current_entry = current.get(relative_path)
+            if (current_entry is not None and
+                    current_entry[0] == entry[0] and os.path.exists(path)):
+                result[relative_path] = current_entry
+                continue
+            object_path = self.object_path(entry[0])
+            if not os.path.exists(object_path):
+                # Collected or deleted by hand. SCons will rebuild it.
+                continue
+            parent = os.path.dirname(path)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            link_or_copy(object_path, path,
+                         can_hard_link(path, object_path))
+            stat = os.stat(path)
+            result[relative_path] = (entry[0], stat.st_size, stat.st_mtime,
+                                     stat.st_ino)
+        return result
+
+    def collect_garbage(self, manifest_paths):
+        """Removes all objects that none of the manifests at manifest_paths
+        reference. Returns the number of objects and bytes removed."""
+        referenced = set()
+        for manifest_path in manifest_paths:
+            referenced.update(entry[0] for entry in
+                              load_manifest(manifest_path).values())
+        removed_objects = 0
+        removed_bytes = 0
+        for object_path in glob.glob(os.path.join(self.path, '*', '*')):
+            directory, name = os.path.split(object_path)
+            digest = os.path.basename(directory) + name
+            if digest in referenced:
+                continue
+            removed_bytes += os.path.getsize(object_path)
+            removed_objects += 1
+            os.remove(object_path)
+        return removed_objects, removed_bytes
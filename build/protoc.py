@@ -2,7 +2,10 @@
 protoc.py: Protoc Builder for SCons
 
 This Builder invokes protoc to generate C++ and Python 
-from a .proto file.  
+from .proto files. All sources of a builder call are compiled by a
+single protoc run, and the generated files are only written if their
+contents changed, so that the objects depending on the other .proto
+files are not rebuilt.
  
 NOTE: Java is not currently supported."""
 
@@ -17,12 +20,68 @@ import SCons.Util
 from SCons.Script import File, Dir
  
 import os.path
+import shutil
+import subprocess
+
+from build import util
+
 protocs = 'protoc'
 
-ProtocAction = SCons.Action.Action('$PROTOCCOM', '$PROTOCCOMSTR')
+def _copy_changed(source_dir, target_dir):
+    """Copies the files in source_dir to target_dir, skipping the ones
+    whose contents are the same already."""
+    for root, dirs, files in os.walk(source_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            target = os.path.join(target_dir, os.path.relpath(path, source_dir))
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            with open(path, 'rb') as f:
+                util.write_if_changed(target, f.read(), binary=True)
+
+def _run_protoc(target, source, env):
+    """Runs $PROTOCCOM with the output directories redirected to a
+    temporary directory and copies the changed files to the real ones."""
+    output_dirs = [env.subst('$PROTOCOUTDIR', target=target, source=source)]
+    if env.subst('$PROTOCPYTHONOUTDIR'):
+        output_dirs.append(env.subst('$PROTOCPYTHONOUTDIR', target=target, source=source))
+    temp_root = os.path.join(str(target[0].dir), '.protoc.tmp')
+    if os.path.isdir(temp_root):
+        shutil.rmtree(temp_root)
+    temp_dirs = [os.path.join(temp_root, str(index)) for index in range(len(output_dirs))]
+    for temp_dir in temp_dirs:
+        os.makedirs(temp_dir)
+    overrides = {'PROTOCOUTDIR': temp_dirs[0]}
+    if len(temp_dirs) > 1:
+        overrides['PROTOCPYTHONOUTDIR'] = temp_dirs[1]
+    command = env.Override(overrides).subst_list('$PROTOCCOM', target=target, source=source)[0]
+    try:
+        result = subprocess.call([str(arg) for arg in command], env=env['ENV'])
+        if result == 0:
+            for temp_dir, output_dir in zip(temp_dirs, output_dirs):
+                _copy_changed(temp_dir, output_dir)
+    finally:
+        shutil.rmtree(temp_root)
+    return result
+
+def _protoc_generator(source, target, env, for_signature):
+    if for_signature:
+        return '$PROTOCCOM'
+    def protoc_string(target, source, env):
+        return (env.subst('$PROTOCCOMSTR', target=target, source=source) or
+                env.subst('$PROTOCCOM', target=target, source=source))
+    return SCons.Action.Action(_run_protoc, strfunction=protoc_string)
+
+ProtocAction = SCons.Action.CommandGeneratorAction(_protoc_generator, {})
 def ProtocEmitter(target, source, env):
     dirOfCallingSConscript = Dir('.').srcnode()
-    env.Prepend(PROTOCPROTOPATH = dirOfCallingSConscript.path)
+    # Assign a new list instead of prepending in place, the list may be
+    # shared with other calls. A directory is only passed to protoc once.
+    protopath = [dirOfCallingSConscript.path]
+    for path in SCons.Util.flatten(env.get('PROTOCPROTOPATH', [])):
+        if path not in protopath:
+            protopath.append(path)
+    env['PROTOCPROTOPATH'] = protopath
 
     source_with_corrected_path = []
     for src in source:
@@ -54,6 +113,8 @@ def ProtocEmitter(target, source, env):
     #~ print("PROTOC SOURCE:", [str(s) for s in source])
     #~ print("PROTOC TARGET:", [str(s) for s in target])
 
+    # _run_protoc only rewrites changed files.
+    env.Precious(target)
     return target, source
 
 ProtocBuilder = SCons.Builder.Builder(action = ProtocAction,
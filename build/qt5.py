@@ -32,9 +32,17 @@ selection method.
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import atexit
+import hashlib
+import io
+import json
 import os.path
+import pickle
 import re
+import subprocess
 import sys
+import threading
+import time
 
 import SCons.Action
 import SCons.Builder
@@ -43,6 +51,8 @@ import SCons.Scanner
 import SCons.Tool
 import SCons.Util
 
+from build import util
+
 class ToolQt5Warning(SCons.Warnings.Warning):
     pass
 
@@ -106,13 +116,400 @@ def checkMocIncluded(target, source, env):
             "Generated moc file '%s' is not included by '%s'" %
             (str(moc), str(cpp)))
 
-def find_file(filename, paths, node_factory):
+def find_file(filename, paths, node_factory, index=None):
     for dir in paths:
+        # Directories that are known not to contain filename are skipped
+        # without creating a node.
+        if index is not None and not index.contains(dir, filename):
+            continue
         node = node_factory(filename, dir)
         if node.rexists():
             return node
     return None
 
+class _HeaderIndex:
+    """
+    The names in each directory find_file() searches, listed once instead
+    of stat'ing every candidate header. A variant dir is listed together
+    with its source dir.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.listdirs = 0
+        self.lookups = 0
+
+    def contains(self, dir, filename):
+        self.lookups += 1
+        names = self.listings.get(dir.abspath)
+        if names is None:
+            names = set()
+            for path in set([dir.abspath, dir.srcnode().abspath]):
+                self.listdirs += 1
+                try:
+                    names.update(os.listdir(path))
+                except OSError:
+                    pass
+            self.listings[dir.abspath] = names
+        return filename in names
+
+_header_index = _HeaderIndex()
+
+class _ScanCache:
+    """
+    Cache of scan results, e.g. those of the include graph, stored in
+    $QT5_AUTOMOC_CACHEFILE if that is set. A file is only read again when its size or mtime
+    changed, and only scanned again when its contents changed too.
+    """
+
+    # Bump when the entries or the results of a scan function change, so
+    # the entries of the old format are dropped instead of piling up.
+    VERSION = 2
+    # The options of the entries: the includes of _IncludeGraph, the digests
+    # of get_digest() and the stamps of set_stamp().
+    OPTIONS = ('includes', None, 'stamp')
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        self.hits = 0
+        self.reads = 0
+        self.lock = threading.Lock()
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    cache = pickle.load(f)
+            except Exception:
+                cache = None
+            if isinstance(cache, dict) and cache.get('version') == _ScanCache.VERSION:
+                self.entries = dict((key, entry) for key, entry in cache['entries'].items()
+                                    if key[1] in _ScanCache.OPTIONS)
+                self.changed = len(self.entries) != len(cache['entries'])
+            else:
+                # Rewrite the file even if nothing is scanned this run.
+                self.changed = cache is not None
+            atexit.register(self.save)
+
+    @staticmethod
+    def source_path(node):
+        path = node.abspath
+        if not os.path.exists(path):
+            # A source of a variant dir that isn't duplicated.
+            path = node.srcnode().abspath
+        return path
+
+    def get_path(self, path, options, scan, trace=None):
+        """
+        Returns scan(contents of the file at path), computed with the given
+        options or taken from the cache. Raises OSError if the file doesn't
+        exist. Doesn't touch any nodes, so it can be called from several
+        threads. If trace, a _Trace, is given, the time taken and the bytes
+        read are recorded there.
+        """
+        start = time.time()
+        stat = os.stat(path)
+        key = (path, options)
+        entry = self.entries.get(key)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime):
+            with self.lock:
+                self.hits += 1
+            if trace is not None:
+                trace.record('scan', file=path, seconds=time.time() - start,
+                             bytes=0, cached=True)
+            return entry[3]
+        with io.open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        cached = entry is not None and entry[2] == digest
+        if cached:
+            result = entry[3]
+        else:
+            result = scan(data.decode('utf-8', 'replace'))
+        with self.lock:
+            self.reads += 1
+            self.entries[key] = (stat.st_size, stat.st_mtime, digest, result)
+            self.changed = True
+        if trace is not None:
+            trace.record('scan', file=path, seconds=time.time() - start,
+                         bytes=len(data), cached=cached)
+        return result
+
+    def get_digest(self, path):
+        """
+        Returns the size and the SHA-1 of the file at path, which is only
+        read if its size or mtime changed.
+        """
+        stat = os.stat(path)
+        key = (path, None)
+        entry = self.entries.get(key)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime):
+            with self.lock:
+                self.hits += 1
+            return stat.st_size, entry[2]
+        digest = hashlib.sha1()
+        with io.open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        with self.lock:
+            self.reads += 1
+            self.entries[key] = (stat.st_size, stat.st_mtime, digest.hexdigest(), None)
+            self.changed = True
+        return stat.st_size, digest.hexdigest()
+
+    def get_stamp(self, path):
+        """
+        Returns the stamp set_stamp() recorded for the output at path, or
+        None.
+        """
+        entry = self.entries.get((path, 'stamp'))
+        return entry[2] if entry is not None else None
+
+    def set_stamp(self, path, stamp):
+        with self.lock:
+            self.entries[(path, 'stamp')] = (None, None, stamp, None)
+            self.changed = True
+
+    def save(self):
+        if not self.path or not self.changed:
+            return
+        util.write_atomically(self.path, pickle.dumps(
+            {'version': _ScanCache.VERSION, 'entries': self.entries}, 2))
+        self.changed = False
+
+_scan_caches = {}
+
+class _Trace:
+    """
+    A trace of the automoc scans and moc runs, written to $QT5_TRACEFILE
+    with one JSON object per line. Every event has the field "event":
+      - "scan": a file was scanned for includes and Q_OBJECT macros. Has
+        "file", "seconds", "bytes" read and whether the result was
+        "cached".
+      - "automoc": automoc decided what to moc for the source "file" and
+        its "header". Has the "strategy" taken and the "moc" targets.
+      - "moc": moc ran for "source". Has "target", "seconds", the "size"
+        of the output and whether it was "cached".
+    When the build ends, a summary with the $QT5_TRACETOP slowest moc runs
+    is printed.
+    """
+
+    def __init__(self, path, top):
+        self.path = path
+        self.top = top
+        self.events = []
+        self.lock = threading.Lock()
+        self.file = open(path, 'w')
+        atexit.register(self.close)
+
+    def record(self, event, **fields):
+        fields['event'] = event
+        line = json.dumps(fields, sort_keys=True)
+        with self.lock:
+            self.events.append(fields)
+            self.file.write(line + '\n')
+
+    def close(self):
+        self.file.close()
+        scans = [event for event in self.events if event['event'] == 'scan']
+        mocs = [event for event in self.events if event['event'] == 'moc']
+        print("scons: qt5: %d scans in %.2fs (%d bytes read), %d moc runs in %.2fs (%d cached), trace in %s" % (
+            len(scans), sum(event['seconds'] for event in scans),
+            sum(event['bytes'] for event in scans),
+            len(mocs), sum(event['seconds'] for event in mocs),
+            len([event for event in mocs if event['cached']]), self.path))
+        if not mocs:
+            return
+        print("scons: qt5: slowest moc runs:")
+        for event in sorted(mocs, key=lambda event: -event['seconds'])[:self.top]:
+            print("%050s... %6.2fs %8d bytes%s" % (
+                event['source'], event['seconds'], event['size'],
+                " (cached)" if event['cached'] else ""))
+
+_traces = {}
+
+def _get_trace(env):
+    """
+    Returns the _Trace of $QT5_TRACEFILE, or None if it isn't set.
+    """
+    path = env.subst('$QT5_TRACEFILE')
+    if not path:
+        return None
+    if path not in _traces:
+        _traces[path] = _Trace(path, int(env.subst('$QT5_TRACETOP')))
+    return _traces[path]
+
+def _get_scan_cache(path):
+    if path not in _scan_caches:
+        _scan_caches[path] = _ScanCache(path)
+    return _scan_caches[path]
+
+# One pass over a source finds its includes and Q_OBJECT macros, skipping
+# string literals. Includes in comments don't count.
+include_token_re = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | "(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*'
+  | ^[ \t]*\#[ \t]*include[ \t]*(?:"(?P<quoted>[^"\n]+)"|<(?P<system>[^>\n]+)>)
+  | (?P<qobject>\bQ_OBJECT\b)
+''', re.M | re.S | re.X)
+qobject_re = re.compile(r'\bQ_OBJECT\b')
+
+def _scan_includes(contents):
+    """
+    Returns (qobject, commented_qobject, quoted_includes, system_includes)
+    for the contents of a source: whether they contain a Q_OBJECT macro in
+    the code, whether they contain one in a comment, and the files included
+    with quotes and with angle brackets, in order.
+    """
+    qobject = False
+    commented_qobject = False
+    quoted = []
+    system = []
+    for match in include_token_re.finditer(contents):
+        if match.group('comment') is not None:
+            if not commented_qobject and qobject_re.search(match.group('comment')):
+                commented_qobject = True
+        elif match.group('quoted') is not None:
+            quoted.append(match.group('quoted').strip())
+        elif match.group('system') is not None:
+            system.append(match.group('system').strip())
+        elif match.group('qobject') is not None:
+            qobject = True
+    return qobject, commented_qobject, tuple(quoted), tuple(system)
+
+class _IncludeGraph:
+    """
+    The includes of the sources and headers of the build. Every file is
+    scanned once by _scan_includes() and the results are kept in the scan
+    cache. Automoc uses it to find Q_OBJECT macros and included moc files.
+    Other build tools get it from env.IncludeGraph() and query it with
+    absolute paths.
+    """
+
+    def __init__(self, scan_cache):
+        self.scan_cache = scan_cache
+        self.listings = {}
+        self.resolved = {}
+        # The _Trace the scans are recorded in, if any.
+        self.trace = None
+
+    def scan(self, path):
+        """
+        Returns the _scan_includes() result of the file at path. Raises
+        OSError if it doesn't exist. Can be called from several threads.
+        """
+        return self.scan_cache.get_path(path, 'includes', _scan_includes,
+                                        self.trace)
+
+    def prescan(self, paths, jobs):
+        """
+        Scans paths with a pool of jobs threads.
+        """
+        paths = sorted(set(paths))
+        def scan_path(path):
+            try:
+                self.scan(path)
+            except (IOError, OSError):
+                pass
+        if jobs < 2 or len(paths) < 2:
+            for path in paths:
+                scan_path(path)
+            return
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(paths)))
+        try:
+            pool.map(scan_path, paths)
+        finally:
+            pool.close()
+            pool.join()
+
+    def includes(self, path):
+        """
+        Returns the files path includes with quotes, as spelled, or an
+        empty tuple if path doesn't exist.
+        """
+        try:
+            return self.scan(path)[2]
+        except (IOError, OSError):
+            return ()
+
+    def system_includes(self, path):
+        """
+        Returns the files path includes with angle brackets.
+        """
+        try:
+            return self.scan(path)[3]
+        except (IOError, OSError):
+            return ()
+
+    def _contains(self, directory, name):
+        names = self.listings.get(directory)
+        if names is None:
+            try:
+                names = set(os.listdir(directory))
+            except OSError:
+                names = set()
+            self.listings[directory] = names
+        return name in names
+
+    def resolve(self, path, name, include_dirs):
+        """
+        Returns the path of the file path includes as name, looked up next
+        to path and in include_dirs, or None.
+        """
+        key = (os.path.dirname(path), name, tuple(include_dirs))
+        if key not in self.resolved:
+            self.resolved[key] = None
+            for directory in (key[0],) + key[2]:
+                candidate = os.path.normpath(os.path.join(directory, name))
+                if self._contains(os.path.dirname(candidate), os.path.basename(candidate)):
+                    self.resolved[key] = candidate
+                    break
+        return self.resolved[key]
+
+    def includers(self, paths, headers, include_dirs):
+        """
+        Returns a dictionary from each of headers, as spelled in the
+        #include directive, to the files in paths that include it directly
+        or through other headers. Only quoted includes are followed.
+        """
+        headers = set(headers)
+        included_headers = {}
+
+        def check(path):
+            if path not in included_headers:
+                # Guard against include cycles.
+                included_headers[path] = frozenset()
+                found = set()
+                for name in self.includes(path):
+                    if name in headers:
+                        found.add(name)
+                    resolved = self.resolve(path, name, include_dirs)
+                    if resolved is not None:
+                        found.update(check(resolved))
+                included_headers[path] = frozenset(found)
+            return included_headers[path]
+
+        includers = dict((header, []) for header in headers)
+        for path in paths:
+            for header in check(path):
+                includers[header].append(path)
+        return includers
+
+_include_graphs = {}
+
+def _get_include_graph(path):
+    if path not in _include_graphs:
+        _include_graphs[path] = _IncludeGraph(_get_scan_cache(path))
+    return _include_graphs[path]
+
+def IncludeGraph(env):
+    """
+    Returns the include graph of the build, which shares the cache file
+    $QT5_AUTOMOC_CACHEFILE with automoc.
+    """
+    return _get_include_graph(env.subst('$QT5_AUTOMOC_CACHEFILE'))
+
 class _Automoc:
     """
     Callable class, which works as an emitter for Programs, SharedLibraries and
@@ -121,14 +518,45 @@ class _Automoc:
 
     def __init__(self, objBuilderName):
         self.objBuilderName = objBuilderName
-        # some regular expressions:
-        # Q_OBJECT detection
-        self.qo_search = re.compile(r'[^A-Za-z0-9]Q_OBJECT[^A-Za-z0-9]')
-        # cxx and c comment 'eater'
-        self.ccomment = re.compile(r'/\*(.*?)\*/',re.S)
-        self.cxxcomment = re.compile(r'//.*$',re.M)
-        # we also allow Q_OBJECT in a literal string
-        self.literal_qobject = re.compile(r'"[^\n]*Q_OBJECT[^\n]*"')
+
+    def scan(self, node, moc_options):
+        """
+        Returns whether node contains a Q_OBJECT macro, in a comment too
+        unless comments are gobbled, and the files it includes with quotes.
+        Raises OSError if node doesn't exist.
+        """
+        qobject, commented_qobject, includes, _ = self.include_graph.scan(
+            _ScanCache.source_path(node))
+        if commented_qobject and not moc_options['gobble_comments']:
+            qobject = True
+        return qobject, includes
+
+    def find_header(self, env, moc_options, cpp):
+        """
+        Returns the header of cpp, searched for in the directory of cpp
+        and the cpppaths, or None.
+        """
+        for h_ext in header_extensions:
+            hname = self.splitext(cpp.name)[0] + h_ext
+            h = find_file(hname, [cpp.get_dir()]+moc_options['cpppaths'], env.File,
+                          _header_index)
+            if h:
+                return h
+        return None
+
+    def prescan(self, env, moc_options, cpps, jobs):
+        """
+        Scans cpps and their headers with a pool of jobs threads, so the
+        strategies find the results in the include graph. Only the paths
+        are collected here; nodes are not thread-safe and the strategies
+        still create all nodes serially and in order.
+        """
+        paths = []
+        for cpp in cpps:
+            for node in (cpp, self.find_header(env, moc_options, cpp)):
+                if node is not None:
+                    paths.append(_ScanCache.source_path(node))
+        self.include_graph.prescan(paths, jobs)
         
     def create_automoc_options(self, env):
         """
@@ -140,6 +568,7 @@ class _Automoc:
                        'auto_scan_strategy' : 0,
                        'gobble_comments' : 0,
                        'debug' : 0,
+                       'jobs' : 1,
                        'auto_cpppath' : True,
                        'cpppaths' : []}
         try:
@@ -159,6 +588,10 @@ class _Automoc:
             moc_options['debug'] = int(env.subst('$QT5_DEBUG'))
         except ValueError:
             pass
+        try:
+            moc_options['jobs'] = int(env.subst('$QT5_AUTOSCAN_JOBS'))
+        except ValueError:
+            pass
         try:
             if int(env.subst('$QT5_AUTOMOC_SCANCPPPATH')) == 0:
                 moc_options['auto_cpppath'] = False
@@ -168,12 +601,20 @@ class _Automoc:
             paths = env.get('QT5_AUTOMOC_CPPPATH', [])
             if not paths:
                 paths = env.get('CPPPATH', [])
-            moc_options['cpppaths'].extend(paths)
+            moc_options['cpppaths'].extend(env.Dir(path) if SCons.Util.is_String(path) else path
+                                           for path in SCons.Util.flatten(paths))
         
         return moc_options
 
+    def trace_automoc(self, cpp, h, strategy, mocs):
+        if self.trace is not None:
+            self.trace.record('automoc', file=str(cpp),
+                              header=str(h) if h else None, strategy=strategy,
+                              moc=[str(moc) for moc in mocs])
+
     def __automoc_strategy_simple(self, env, moc_options, 
-                                  cpp, cpp_contents, out_sources):
+                                  cpp, cpp_scan, out_sources,
+                                  strategy='simple'):
         """
         Default Automoc strategy (Q_OBJECT driven): detect a header file
         (alongside the current cpp/cxx) that contains a Q_OBJECT
@@ -182,33 +623,25 @@ class _Automoc:
         it gets MOCed too.
         """
         
-        h=None
-        for h_ext in header_extensions:
-            # try to find the header file in the corresponding source
-            # directory
-            hname = self.splitext(cpp.name)[0] + h_ext
-            h = find_file(hname, [cpp.get_dir()]+moc_options['cpppaths'], env.File)
-            if h:
-                if moc_options['debug']:
-                    print("scons: qt5: Scanning '%s' (header of '%s')" % (str(h), str(cpp)))
-                h_contents = h.get_text_contents()
-                if moc_options['gobble_comments']:
-                    h_contents = self.ccomment.sub('', h_contents)
-                    h_contents = self.cxxcomment.sub('', h_contents)
-                h_contents = self.literal_qobject.sub('""', h_contents)
-                break
+        mocs = []
+        cpp_qobject, cpp_includes = cpp_scan
+        h = self.find_header(env, moc_options, cpp)
+        if h:
+            if moc_options['debug']:
+                print("scons: qt5: Scanning '%s' (header of '%s')" % (str(h), str(cpp)))
+            h_qobject, _ = self.scan(h, moc_options)
         if not h and moc_options['debug']:
             print("scons: qt5: no header for '%s'." % (str(cpp)))
-        if h and self.qo_search.search(h_contents):
+        if h and h_qobject:
             # h file with the Q_OBJECT macro found -> add moc_cpp
             moc_cpp = env.Moc5(h)
+            mocs.extend(moc_cpp)
             if moc_options['debug']:
                 print("scons: qt5: found Q_OBJECT macro in '%s', moc'ing to '%s'" % (str(h), str(moc_cpp)))
             
             # Now, check whether the corresponding CPP file
             # includes the moc'ed output directly...
-            inc_moc_cpp = r'^\s*#\s*include\s+"%s"' % str(moc_cpp[0])
-            if cpp and re.search(inc_moc_cpp, cpp_contents, re.M):
+            if cpp and str(moc_cpp[0]) in cpp_includes:
                 if moc_options['debug']:
                     print("scons: qt5: CXX file '%s' directly includes the moc'ed output '%s', no compiling required" % (str(cpp), str(moc_cpp)))
                 env.Depends(cpp, moc_cpp)
@@ -217,16 +650,18 @@ class _Automoc:
                 if moc_options['debug']:
                     print("scons: qt5: compiling '%s' to '%s'" % (str(cpp), str(moc_o)))
                 out_sources.extend(moc_o)
-        if cpp and self.qo_search.search(cpp_contents):
+        if cpp and cpp_qobject:
             # cpp file with Q_OBJECT macro found -> add moc
             # (to be included in cpp)
             moc = env.Moc5(cpp)
             env.Ignore(moc, moc)
+            mocs.extend(moc)
             if moc_options['debug']:
                 print("scons: qt5: found Q_OBJECT macro in '%s', moc'ing to '%s'" % (str(cpp), str(moc)))
+        self.trace_automoc(cpp, h, strategy, mocs)
 
     def __automoc_strategy_include_driven(self, env, moc_options,
-                                          cpp, cpp_contents, out_sources):
+                                          cpp, cpp_scan, out_sources):
         """
         Automoc strategy #1 (include driven): searches for "include"
         statements of MOCed files in the current cpp/cxx file.
@@ -235,42 +670,33 @@ class _Automoc:
         """
         if self.splitext(str(cpp))[1] in cxx_suffixes:
             added = False
+            mocs = []
+            h = None
             h_moc = "%s%s%s" % (env.subst('$QT5_XMOCHPREFIX'),
                                 self.splitext(cpp.name)[0],
                                 env.subst('$QT5_XMOCHSUFFIX'))
             cxx_moc = "%s%s%s" % (env.subst('$QT5_XMOCCXXPREFIX'),
                                   self.splitext(cpp.name)[0],
                                   env.subst('$QT5_XMOCCXXSUFFIX'))
-            inc_h_moc = r'#include\s+"%s"' % h_moc
-            inc_cxx_moc = r'#include\s+"%s"' % cxx_moc
+            cpp_qobject, cpp_includes = cpp_scan
             
             # Search for special includes in qtsolutions style
-            if cpp and re.search(inc_h_moc, cpp_contents):
+            if cpp and h_moc in cpp_includes:
                 # cpp file with #include directive for a MOCed header found -> add moc
                 
                 # Try to find header file                    
-                h=None
-                hname=""
-                for h_ext in header_extensions:
-                    # Try to find the header file in the
-                    # corresponding source directory
-                    hname = self.splitext(cpp.name)[0] + h_ext
-                    h = find_file(hname, [cpp.get_dir()]+moc_options['cpppaths'], env.File)
-                    if h:
-                        if moc_options['debug']:
-                            print("scons: qt5: Scanning '%s' (header of '%s')" % (str(h), str(cpp)))
-                        h_contents = h.get_text_contents()
-                        if moc_options['gobble_comments']:
-                            h_contents = self.ccomment.sub('', h_contents)
-                            h_contents = self.cxxcomment.sub('', h_contents)
-                        h_contents = self.literal_qobject.sub('""', h_contents)
-                        break
+                h = self.find_header(env, moc_options, cpp)
+                if h:
+                    if moc_options['debug']:
+                        print("scons: qt5: Scanning '%s' (header of '%s')" % (str(h), str(cpp)))
+                    h_qobject, _ = self.scan(h, moc_options)
                 if not h and moc_options['debug']:
                     print("scons: qt5: no header for '%s'." % (str(cpp)))
-                if h and self.qo_search.search(h_contents):
+                if h and h_qobject:
                     # h file with the Q_OBJECT macro found -> add moc_cpp
                     moc_cpp = env.XMoc5(h)
                     env.Ignore(moc_cpp, moc_cpp)
+                    mocs.extend(moc_cpp)
                     added = True
                     # Removing file from list of sources, because it is not to be
                     # compiled but simply included by the cpp/cxx file.
@@ -283,24 +709,28 @@ class _Automoc:
                         print("scons: qt5: found Q_OBJECT macro in '%s', moc'ing to '%s'" % (str(h), str(h_moc)))
                 else:
                     if moc_options['debug']:
-                        print("scons: qt5: found no Q_OBJECT macro in '%s', but a moc'ed version '%s' gets included in '%s'" % (str(h), inc_h_moc, cpp.name))
+                        print("scons: qt5: found no Q_OBJECT macro in '%s', but a moc'ed version '%s' gets included in '%s'" % (str(h), h_moc, cpp.name))
 
-            if cpp and re.search(inc_cxx_moc, cpp_contents):
+            if cpp and cxx_moc in cpp_includes:
                 # cpp file with #include directive for a MOCed cxx file found -> add moc
-                if self.qo_search.search(cpp_contents):
+                if cpp_qobject:
                     moc = env.XMoc5(target=cxx_moc, source=cpp)
                     env.Ignore(moc, moc)
+                    mocs.extend(moc)
                     added = True
                     if moc_options['debug']:
                         print("scons: qt5: found Q_OBJECT macro in '%s', moc'ing to '%s'" % (str(cpp), str(moc)))
                 else:
                     if moc_options['debug']:
-                        print("scons: qt5: found no Q_OBJECT macro in '%s', although a moc'ed version '%s' of itself gets included" % (cpp.name, inc_cxx_moc))
+                        print("scons: qt5: found no Q_OBJECT macro in '%s', although a moc'ed version '%s' of itself gets included" % (cpp.name, cxx_moc))
 
-            if not added:
+            if added:
+                self.trace_automoc(cpp, h, 'include driven', mocs)
+            else:
                 # Fallback to default Automoc strategy (Q_OBJECT driven)
                self.__automoc_strategy_simple(env, moc_options, cpp,
-                                              cpp_contents, out_sources)
+                                              cpp_scan, out_sources,
+                                              'include driven, fell back to simple')
         
     def __call__(self, target, source, env):
         """
@@ -311,6 +741,9 @@ class _Automoc:
         
         # some shortcuts used in the scanner
         self.splitext = SCons.Util.splitext
+        self.include_graph = IncludeGraph(env)
+        self.trace = _get_trace(env)
+        self.include_graph.trace = self.trace
         self.objBuilder = getattr(env, self.objBuilderName)
 
         # The following is kind of hacky to get builders working properly (FIXME)
@@ -324,6 +757,13 @@ class _Automoc:
         # make a deep copy for the result; MocH objects will be appended
         out_sources = source[:]
 
+        if moc_options['auto_scan'] and moc_options['jobs'] > 1:
+            cpps = [cpp for obj in source
+                    if not isinstance(obj, str) and obj.has_builder()
+                    for cpp in (getattr(obj.attributes, 'unity_sources', None) or obj.sources[:1])
+                    if self.splitext(str(cpp))[1] in cxx_suffixes]
+            self.prescan(env, moc_options, cpps, moc_options['jobs'])
+
         for obj in source:
             if not moc_options['auto_scan']:
                 break
@@ -335,28 +775,32 @@ class _Automoc:
                 if moc_options['debug']:
                     print("scons: qt5: '%s' seems to be a binary. Discarded." % str(obj))
                 continue
-            cpp = obj.sources[0]
-            if not self.splitext(str(cpp))[1] in cxx_suffixes:
-                if moc_options['debug']:
-                    print("scons: qt5: '%s' is no cxx file. Discarded." % str(cpp))
-                # c or fortran source
-                continue
-            try:
-                cpp_contents = cpp.get_text_contents()
-                if moc_options['gobble_comments']:
-                    cpp_contents = self.ccomment.sub('', cpp_contents)
-                    cpp_contents = self.cxxcomment.sub('', cpp_contents)
-                cpp_contents = self.literal_qobject.sub('""', cpp_contents)
-            except: continue # may be an still not generated source
+            # Sources merged by the unity build are scanned one by one, the
+            # generated unity source only includes them.
+            cpps = getattr(obj.attributes, 'unity_sources', None) or obj.sources[:1]
+            for cpp in cpps:
+                if not self.splitext(str(cpp))[1] in cxx_suffixes:
+                    if moc_options['debug']:
+                        print("scons: qt5: '%s' is no cxx file. Discarded." % str(cpp))
+                    # c or fortran source
+                    continue
+                try:
+                    cpp_scan = self.scan(cpp, moc_options)
+                except: continue # may be an still not generated source
             
-            if moc_options['auto_scan_strategy'] == 0:
-                # Default Automoc strategy (Q_OBJECT driven)
-                self.__automoc_strategy_simple(env, moc_options,
-                                               cpp, cpp_contents, out_sources)
-            else:
-                # Automoc strategy #1 (include driven)
-                self.__automoc_strategy_include_driven(env, moc_options,
-                                                       cpp, cpp_contents, out_sources)
+                if moc_options['auto_scan_strategy'] == 0:
+                    # Default Automoc strategy (Q_OBJECT driven)
+                    self.__automoc_strategy_simple(env, moc_options,
+                                                   cpp, cpp_scan, out_sources)
+                else:
+                    # Automoc strategy #1 (include driven)
+                    self.__automoc_strategy_include_driven(env, moc_options,
+                                                           cpp, cpp_scan, out_sources)
+
+        if moc_options['debug']:
+            scan_cache = self.include_graph.scan_cache
+            print("scons: qt5: scan cache: %d hits, %d files read" % (scan_cache.hits, scan_cache.reads))
+            print("scons: qt5: header index: %d lookups, %d directories listed" % (_header_index.lookups, _header_index.listdirs))
 
         # restore the original env attributes (FIXME)
         self.objBuilder.env = objBuilderEnv
@@ -456,6 +900,169 @@ def __qrc_emitter(target, source, env):
 
     return t, source
 
+#
+# Cached moc and uic
+#
+moc_comment_re = re.compile(r'//[^\n]*|/\*.*?\*/|("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')', re.S)
+
+def _moc_tokens(contents):
+    """
+    Returns contents without comments and with normalized whitespace, which
+    is all the output of moc depends on.
+    """
+    contents = moc_comment_re.sub(lambda match: match.group(1) or ' ', contents)
+    lines = (' '.join(line.split()) for line in contents.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def _moc_key(env, args, target, source):
+    """
+    The key of the moc output: moc itself, its arguments, the tokens of the
+    source and the contents of everything the source includes.
+    """
+    digest = hashlib.sha1()
+    moc = env.WhereIs(args[0]) or args[0]
+    try:
+        stat = os.stat(moc)
+        digest.update(('%s:%d:%d\0' % (moc, stat.st_size, int(stat.st_mtime))).encode('utf-8'))
+    except OSError:
+        pass
+    for arg in args[1:]:
+        digest.update(arg.encode('utf-8') + b'\0')
+    digest.update(_moc_tokens(source[0].get_text_contents()).encode('utf-8', 'replace'))
+    for dependency in sorted(target[0].implicit or [], key=str):
+        digest.update(('\0%s:%s' % (dependency, dependency.get_csig())).encode('utf-8'))
+    return digest.hexdigest()
+
+def _uic_key(env, args, target, source):
+    """
+    The key of the uic output: uic itself, its arguments and the .ui file.
+    """
+    digest = hashlib.sha1()
+    uic = env.WhereIs(args[0]) or args[0]
+    try:
+        stat = os.stat(uic)
+        digest.update(('%s:%d:%d\0' % (uic, stat.st_size, int(stat.st_mtime))).encode('utf-8'))
+    except OSError:
+        pass
+    for arg in args[1:]:
+        digest.update(arg.encode('utf-8') + b'\0')
+    digest.update(source[0].get_contents())
+    return digest.hexdigest()
+
+def _run_cached(env, args, output_index, temp_path, target_path, cache_file):
+    """
+    Runs args, a command writing to args[output_index], with the output
+    redirected to temp_path, and writes the output to target_path if it
+    changed. If cache_file exists it is used instead of running the
+    command, otherwise the output is stored there. Returns the exit code.
+    """
+    if cache_file is not None and os.path.isfile(cache_file):
+        with open(cache_file, 'rb') as f:
+            util.write_if_changed(target_path, f.read(), binary=True)
+        return 0
+    args = args[:output_index] + [temp_path] + args[output_index + 1:]
+    result = subprocess.call(args, env=env['ENV'])
+    if result != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return result
+    with open(temp_path, 'rb') as f:
+        output = f.read()
+    os.remove(temp_path)
+    if cache_file is not None:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            try:
+                os.makedirs(os.path.dirname(cache_file))
+            except OSError:
+                # Created by a parallel job.
+                pass
+        util.write_if_changed(cache_file, output, binary=True)
+    util.write_if_changed(target_path, output, binary=True)
+    return 0
+
+def _get_cache_file(env, cache_dir_variable, key_function, args, output_index,
+                    target, source, suffix):
+    cache_dir = env.subst(cache_dir_variable)
+    if not cache_dir:
+        return None
+    key = key_function(env, args[:output_index] + args[output_index + 1:],
+                       target, source)
+    return os.path.join(cache_dir, key[:2], key[2:] + suffix)
+
+def _moc_action(command, for_signature):
+    """
+    Returns an action running command, a moc command line writing to
+    $TARGET. The output is looked up in $QT5_MOCCACHEDIR first, and the
+    target is only written if its contents change, so targets that are
+    Precious keep their timestamp after an edit that doesn't change the
+    output of moc.
+    """
+    if for_signature:
+        return command
+
+    def run_moc(target, source, env):
+        args = [str(arg) for arg in env.subst_list(command, target=target, source=source)[0]]
+        target_path = str(target[0])
+        output_index = args.index('-o') + 1
+        cache_file = _get_cache_file(env, '$QT5_MOCCACHEDIR', _moc_key, args,
+                                     output_index, target, source, '.cpp')
+        trace = _get_trace(env)
+        cached = cache_file is not None and os.path.isfile(cache_file)
+        start = time.time()
+        # moc computes the include path in its output relative to the output
+        # file, so the temporary file has to be next to the target.
+        result = _run_cached(env, args, output_index, target_path + '.moc.tmp',
+                             target_path, cache_file)
+        if trace is not None and result == 0:
+            trace.record('moc', source=str(source[0]), target=target_path,
+                         seconds=time.time() - start,
+                         size=os.path.getsize(target_path), cached=cached)
+        return result
+
+    def moc_string(target, source, env):
+        return (env.subst('$QT5_MOCCOMSTR', target=target, source=source) or
+                env.subst(command, target=target, source=source))
+
+    return SCons.Action.Action(run_moc, strfunction=moc_string)
+
+def _uic_action(command, for_signature):
+    """
+    Like _moc_action, for a uic command line. The output is cached in
+    $QT5_UICCACHEDIR.
+    """
+    if for_signature:
+        return command
+
+    def run_uic(target, source, env):
+        args = [str(arg) for arg in env.subst_list(command, target=target, source=source)[0]]
+        target_path = str(target[0])
+        output_index = args.index('-o') + 1
+        cache_file = _get_cache_file(env, '$QT5_UICCACHEDIR', _uic_key, args,
+                                     output_index, target, source, '.h')
+        # uic derives the include guard from the name of the output file, so
+        # the temporary file keeps the name in a directory of its own.
+        temp_dir = os.path.join(os.path.dirname(target_path), 'uic.tmp')
+        if not os.path.isdir(temp_dir):
+            try:
+                os.makedirs(temp_dir)
+            except OSError:
+                # Created by a parallel job.
+                pass
+        return _run_cached(env, args, output_index,
+                           os.path.join(temp_dir, os.path.basename(target_path)),
+                           target_path, cache_file)
+
+    def uic_string(target, source, env):
+        return (env.subst('$QT5_UICCOMSTR', target=target, source=source) or
+                env.subst(command, target=target, source=source))
+
+    return SCons.Action.Action(run_uic, strfunction=uic_string)
+
+def _precious_emitter(target, source, env):
+    # The cached moc and uic actions only rewrite changed targets.
+    env.Precious(target)
+    return target, source
+
 #
 # Action generators
 #
@@ -468,9 +1075,9 @@ def __moc_generator_from_h(source, target, env, for_signature):
         pass
     
     if pass_defines:
-        return '$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE'
+        return _moc_action('$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature)
     else:
-        return '$QT5_MOC $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE'
+        return _moc_action('$QT5_MOC $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature)
 
 def __moc_generator_from_cxx(source, target, env, for_signature):
     pass_defines = False
@@ -481,10 +1088,10 @@ def __moc_generator_from_cxx(source, target, env, for_signature):
         pass
     
     if pass_defines:
-        return ['$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE',
+        return [_moc_action('$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature),
                 SCons.Action.Action(checkMocIncluded,None)]
     else:
-        return ['$QT5_MOC $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE',
+        return [_moc_action('$QT5_MOC $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature),
                 SCons.Action.Action(checkMocIncluded,None)]
 
 def __mocx_generator_from_h(source, target, env, for_signature):
@@ -496,9 +1103,9 @@ def __mocx_generator_from_h(source, target, env, for_signature):
         pass
     
     if pass_defines:
-        return '$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE'
+        return _moc_action('$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature)
     else:
-        return '$QT5_MOC $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE'
+        return _moc_action('$QT5_MOC $QT5_MOCFROMHFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature)
 
 def __mocx_generator_from_cxx(source, target, env, for_signature):
     pass_defines = False
@@ -509,12 +1116,15 @@ def __mocx_generator_from_cxx(source, target, env, for_signature):
         pass
     
     if pass_defines:
-        return ['$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE',
+        return [_moc_action('$QT5_MOC $QT5_MOCDEFINES $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature),
                 SCons.Action.Action(checkMocIncluded,None)]
     else:
-        return ['$QT5_MOC $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE',
+        return [_moc_action('$QT5_MOC $QT5_MOCFROMCXXFLAGS $QT5_MOCINCFLAGS -o $TARGET $SOURCE', for_signature),
                 SCons.Action.Action(checkMocIncluded,None)]
 
+def __uic_generator(source, target, env, for_signature):
+    return _uic_action('$QT5_UICCOM', for_signature)
+
 def __qrc_generator(source, target, env, for_signature):
     name_defined = False
     try:
@@ -564,10 +1174,6 @@ __ts_builder = SCons.Builder.Builder(
         action = SCons.Action.Action('$QT5_LUPDATECOM','$QT5_LUPDATECOMSTR'),
         suffix = '.ts',
         source_factory = SCons.Node.FS.Entry)
-__qm_builder = SCons.Builder.Builder(
-        action = SCons.Action.Action('$QT5_LRELEASECOM','$QT5_LRELEASECOMSTR'),
-        src_suffix = '.ts',
-        suffix = '.qm')
 __qrc_builder = SCons.Builder.Builder(
         action = SCons.Action.CommandGeneratorAction(__qrc_generator, {'cmdstr':'$QT5_QRCCOMSTR'}),
         source_scanner = __qrcscanner,
@@ -575,10 +1181,20 @@ __qrc_builder = SCons.Builder.Builder(
         suffix = '$QT5_QRCCXXSUFFIX',
         prefix = '$QT5_QRCCXXPREFIX',
         single_source = 1)
+# Qrc5Chunks declares the dependencies of the chunks on their resources, so
+# they don't need the scanner.
+__qrc_chunk_builder = SCons.Builder.Builder(
+        action = SCons.Action.CommandGeneratorAction(__qrc_generator, {'cmdstr':'$QT5_QRCCOMSTR'}),
+        emitter = __qrc_emitter,
+        src_suffix = '$QT5_QRCSUFFIX',
+        suffix = '$QT5_QRCCXXSUFFIX',
+        prefix = '$QT5_QRCCXXPREFIX',
+        single_source = 1)
 __ex_moc_builder = SCons.Builder.Builder(
         action = SCons.Action.CommandGeneratorAction(__moc_generator_from_h, {'cmdstr':'$QT5_MOCCOMSTR'}))
 __ex_uic_builder = SCons.Builder.Builder(
-        action = SCons.Action.Action('$QT5_UICCOM', '$QT5_UICCOMSTR'),
+        action = SCons.Action.CommandGeneratorAction(__uic_generator, {'cmdstr':'$QT5_UICCOMSTR'}),
+        emitter = _precious_emitter,
         src_suffix = '.ui')
 
 
@@ -589,6 +1205,8 @@ def Ts5(env, target, source=None, *args, **kw):
     """
     A pseudo-Builder wrapper around the LUPDATE executable of Qt5.
         lupdate [options] [source-file|path]... -ts ts-files
+    lupdate is run once for all targets, so the sources are only parsed
+    once however many .ts files there are.
     """
     if not SCons.Util.is_List(target):
         target = [target]
@@ -605,37 +1223,124 @@ def Ts5(env, target, source=None, *args, **kw):
     except ValueError:
         pass
     
-    result = []
-    for t in target:
-        obj = __ts_builder.__call__(env, t, source, **kw)
-        # Prevent deletion of the .ts file, unless explicitly specified
-        if not clean_ts:
-            env.NoClean(obj)
-        # Always make our target "precious", such that it is not deleted
-        # prior to a rebuild
-        env.Precious(obj)
-        # Add to resulting target list        
-        result.extend(obj)
+    result = __ts_builder.__call__(env, target, source, **kw)
+    # Prevent deletion of the .ts files, unless explicitly specified
+    if not clean_ts:
+        env.NoClean(result)
+    # Always make our targets "precious", such that they are not deleted
+    # prior to a rebuild
+    env.Precious(result)
 
     return result
 
+def _lrelease_stamp(env, manifest, qm):
+    # Identifies the inputs of qm: lrelease, its flags and the .ts files.
+    digest = hashlib.sha1(env.subst('$QT5_LRELEASE $QT5_LRELEASEFLAGS').encode('utf-8'))
+    for ts in qm.attributes.ts_sources:
+        digest.update(('\0%s:%s' % (ts.name, manifest.get_digest(ts.srcnode().abspath)[1])).encode('utf-8'))
+    return digest.hexdigest()
+
+def _lrelease(target, source, env):
+    """
+    Runs lrelease for every target whose .ts files changed since it was
+    last built, in $QT5_LRELEASEJOBS threads, and prints how long each of
+    them took.
+    """
+    manifest = _get_scan_cache(env.subst('$QT5_LRELEASEMANIFEST'))
+    jobs = []
+    for qm in target:
+        stamp = _lrelease_stamp(env, manifest, qm)
+        if os.path.exists(qm.abspath) and manifest.get_stamp(qm.abspath) == stamp:
+            continue
+        command = env.subst_list('$QT5_LRELEASECOM', target=[qm],
+                                 source=qm.attributes.ts_sources)[0]
+        jobs.append((qm, [str(arg) for arg in command], stamp))
+
+    process_env = env['ENV']
+    def run(job):
+        qm, command, stamp = job
+        start = time.time()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, env=process_env)
+        output = process.communicate()[0]
+        return process.returncode, output, time.time() - start
+
+    start = time.time()
+    pool_size = min(int(env.subst('$QT5_LRELEASEJOBS')), len(jobs))
+    if pool_size > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(pool_size)
+        try:
+            results = pool.map(run, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [run(job) for job in jobs]
+
+    debug = int(env.subst('$QT5_DEBUG'))
+    failed = 0
+    for (qm, _, stamp), (returncode, output, _) in zip(jobs, results):
+        if returncode != 0:
+            failed += 1
+            sys.stdout.write(output.decode('utf-8', 'replace'))
+            print("lrelease failed for %s" % qm.name)
+            continue
+        manifest.set_stamp(qm.abspath, stamp)
+        if debug:
+            sys.stdout.write(output.decode('utf-8', 'replace'))
+    for (qm, _, _), (returncode, _, duration) in sorted(
+            zip(jobs, results), key=lambda item: -item[1][2]):
+        if returncode == 0:
+            print("%035s... %6.2fs" % (qm.name, duration))
+    print("lrelease: %d of %d translations built in %.2fs, %d unchanged" % (
+        len(jobs) - failed, len(target), time.time() - start,
+        len(target) - len(jobs)))
+    return 1 if failed else 0
+
 def Qm5(env, target, source=None, *args, **kw):
     """
     A pseudo-Builder wrapper around the LRELEASE executable of Qt5.
         lrelease [options] ts-files [-qm qm-file]
+    Without sources, every target is built from the .ts file of the same
+    name. Otherwise every target is built from all sources.
+
+    All targets are built by a single action, which only runs lrelease
+    for the targets whose .ts files changed according to the manifest
+    $QT5_LRELEASEMANIFEST, and runs up to $QT5_LRELEASEJOBS of them in
+    parallel.
     """
     if not SCons.Util.is_List(target):
         target = [target]
-    if not source:
-        source = target[:]
-    if not SCons.Util.is_List(source):
+    if source and not SCons.Util.is_List(source):
         source = [source]
 
-    result = []    
+    def node(name, suffix):
+        if not SCons.Util.is_String(name):
+            name = name.abspath
+        base, ext = os.path.splitext(name)
+        if ext not in ('.ts', '.qm'):
+            base = name
+        return env.File(base + suffix)
+
+    result = []
+    sources = []
     for t in target:
-        result.extend(__qm_builder.__call__(env, t, source, **kw))
+        qm = node(t, '.qm')
+        if source:
+            qm.attributes.ts_sources = [node(s, '.ts') for s in source]
+        else:
+            qm.attributes.ts_sources = [node(t, '.ts')]
+        result.append(qm)
+        sources.extend(ts for ts in qm.attributes.ts_sources if ts not in sources)
+    if not result:
+        return result
 
-    return result
+    # The action skips unchanged targets, so they must not be removed.
+    env.Precious(result)
+    return env.Command(result, sources,
+                       SCons.Action.Action(_lrelease, '$QT5_LRELEASECOMSTR'),
+                       **kw)
 
 def Qrc5(env, target, source=None, *args, **kw):
     """
@@ -655,6 +1360,101 @@ def Qrc5(env, target, source=None, *args, **kw):
 
     return result
 
+def _qrc_alias(name):
+    # The resource name rcc uses for a file without an alias.
+    alias = os.path.normpath(name).replace('\\', '/')
+    while alias.startswith('../'):
+        alias = alias[3:]
+    return alias
+
+def _parse_qrc(path):
+    """
+    Returns the files of the qrc file at path as a list of (prefix, lang,
+    path, alias, attributes). Directories are expanded into their files.
+    """
+    import xml.etree.ElementTree as ElementTree
+    qrc_dir = os.path.dirname(path)
+    files = []
+    for qresource in ElementTree.parse(path).getroot().iter('qresource'):
+        prefix = qresource.get('prefix', '/')
+        lang = qresource.get('lang')
+        for entry in qresource.iter('file'):
+            name = entry.text.strip()
+            attributes = dict((key, value) for key, value in entry.attrib.items()
+                              if key != 'alias')
+            alias = entry.get('alias') or _qrc_alias(name)
+            file_path = os.path.normpath(os.path.join(qrc_dir, name))
+            if not os.path.isdir(file_path):
+                files.append((prefix, lang, file_path, alias, attributes))
+                continue
+            for root, dirs, names in os.walk(file_path):
+                dirs.sort()
+                for name in sorted(names):
+                    relative_path = os.path.relpath(os.path.join(root, name), file_path)
+                    files.append((prefix, lang, os.path.join(root, name),
+                                  alias + '/' + relative_path.replace('\\', '/'),
+                                  attributes))
+    return files
+
+# The locale of translations/mixxx_pt_BR.qm is pt_BR.
+_qm_locale_re = re.compile(r'^[^_]+_(.+)\.qm$')
+
+def Qrc5Chunks(env, source, *args, **kw):
+    """
+    Splits the qrc file source into one qrc file per resource directory and
+    runs rcc on each of them, so a changed resource only rebuilds its own
+    chunk. The translations are split further into one chunk per locale, so
+    a changed locale doesn't rebuild the others. Returns the generated cxx files. Each of them has the attribute
+    qrc_files, a list of (alias, path) of the resources it embeds.
+
+    The chunks are generated into qrc/. Each cxx file depends on the nodes of
+    its resources, so resources built in the same run, like the .qm files of
+    the translations, are built before rcc runs and their signatures decide
+    whether it runs again.
+    """
+    from xml.sax.saxutils import escape, quoteattr
+    qrc = env.File(source)
+    stem = os.path.splitext(qrc.name)[0]
+
+    chunks = {}
+    for prefix, lang, path, alias, attributes in _parse_qrc(qrc.srcnode().abspath):
+        subtree = os.path.dirname(alias)
+        match = _qm_locale_re.match(os.path.basename(alias))
+        if match and os.path.basename(subtree) == 'translations':
+            subtree = '%s/%s' % (subtree, match.group(1))
+        chunks.setdefault(subtree, []).append((prefix, lang, path, alias, attributes))
+
+    result = []
+    for subtree in sorted(chunks):
+        name = re.sub(r'[^A-Za-z0-9_]', '_', '%s_%s' % (stem, subtree or 'root'))
+        qrc_files = []
+        lines = ['<!DOCTYPE RCC><RCC version="1.0">']
+        for key in sorted(set((prefix, lang) for prefix, lang, _, _, _ in chunks[subtree]),
+                          key=lambda key: (key[0], key[1] or '')):
+            prefix, lang = key
+            lang_attribute = ' lang=%s' % quoteattr(lang) if lang else ''
+            lines.append('<qresource prefix=%s%s>' % (quoteattr(prefix), lang_attribute))
+            for file_prefix, file_lang, path, alias, attributes in chunks[subtree]:
+                if (file_prefix, file_lang) != key:
+                    continue
+                qrc_files.append((alias, path))
+                extra_attributes = ''.join(' %s=%s' % (attribute, quoteattr(value))
+                                           for attribute, value in sorted(attributes.items()))
+                lines.append('<file alias=%s%s>%s</file>' % (
+                    quoteattr(alias), extra_attributes, escape(path.replace('\\', '/'))))
+            lines.append('</qresource>')
+        lines.append('</RCC>')
+
+        chunk_qrc = env.Command(os.path.join('qrc', name + env.subst('$QT5_QRCSUFFIX')),
+                                env.Value('\n'.join(lines) + '\n'),
+                                SCons.Action.Action(util.write_value, None))
+        cxx = __qrc_chunk_builder.__call__(env, None, chunk_qrc, **kw)
+        env.Depends(cxx, [env.File(path) for _, path in qrc_files])
+        for node in cxx:
+            node.attributes.qrc_files = qrc_files
+        result.extend(cxx)
+    return result
+
 def ExplicitMoc5(env, target, source, *args, **kw):
     """
     A pseudo-Builder wrapper around the MOC executable of Qt5.
@@ -733,11 +1533,19 @@ def generate(env):
 
         QT5_AUTOSCAN = 1, # Should the qt5 tool try to figure out, which sources are to be moc'ed?
         QT5_AUTOSCAN_STRATEGY = 0, # While scanning for files to moc, should we search for includes in qtsolutions style?
+        QT5_AUTOSCAN_JOBS = 1, # If greater than 1, the files to moc are scanned by this many threads up front.
         QT5_GOBBLECOMMENTS = 0, # If set to 1, comments are removed before scanning cxx/h files.
         QT5_CPPDEFINES_PASSTOMOC = 1, # If set to 1, all CPPDEFINES get passed to the moc executable.
         QT5_CLEAN_TS = 0, # If set to 1, translation files (.ts) get cleaned on 'scons -c'
         QT5_AUTOMOC_SCANCPPPATH = 1, # If set to 1, the CPPPATHs (or QT5_AUTOMOC_CPPPATH) get scanned for moc'able files
         QT5_AUTOMOC_CPPPATH = [], # Alternative paths that get scanned for moc files
+        QT5_AUTOMOC_CACHEFILE = '', # If set, the automoc scan results are kept in this file across runs
+        QT5_MOCCACHEDIR = '', # If set, the output of moc is cached in this directory
+        QT5_UICCACHEDIR = '', # If set, the output of uic is cached in this directory
+        QT5_TRACEFILE = '', # If set, the automoc scans and moc runs are traced to this file, see _Trace
+        QT5_TRACETOP = 10, # The number of slowest moc runs printed with the trace
+        QT5_LRELEASEMANIFEST = '', # If set, Qm5 keeps the hashes of the .ts files in this file across runs
+        QT5_LRELEASEJOBS = 1, # The number of lrelease processes Qm5 runs in parallel
 
         # Some Qt5 specific flags. I don't expect someone wants to
         # manipulate those ...
@@ -768,7 +1576,7 @@ def generate(env):
 
         # Commands for the qt5 support ...
         QT5_UICCOM = '$QT5_UIC $QT5_UICFLAGS -o $TARGET $SOURCE',
-        QT5_LUPDATECOM = '$QT5_LUPDATE $QT5_LUPDATEFLAGS $SOURCES -ts $TARGET',
+        QT5_LUPDATECOM = '$QT5_LUPDATE $QT5_LUPDATEFLAGS $SOURCES -ts $TARGETS',
         QT5_LRELEASECOM = '$QT5_LRELEASE $QT5_LRELEASEFLAGS -qm $TARGET $SOURCES',
         
         # Specialized variables for the Extended Automoc support
@@ -784,6 +1592,8 @@ def generate(env):
         env.AddMethod(Ts5, "Ts5")
         env.AddMethod(Qm5, "Qm5")
         env.AddMethod(Qrc5, "Qrc5")
+        env.AddMethod(Qrc5Chunks, "Qrc5Chunks")
+        env.AddMethod(IncludeGraph, "IncludeGraph")
         env.AddMethod(ExplicitMoc5, "ExplicitMoc5")
         env.AddMethod(ExplicitUic5, "ExplicitUic5")
     except AttributeError:
@@ -792,12 +1602,15 @@ def generate(env):
         SConsEnvironment.Ts5 = Ts5
         SConsEnvironment.Qm5 = Qm5
         SConsEnvironment.Qrc5 = Qrc5
+        SConsEnvironment.Qrc5Chunks = Qrc5Chunks
+        SConsEnvironment.IncludeGraph = IncludeGraph
         SConsEnvironment.ExplicitMoc5 = ExplicitMoc5
         SConsEnvironment.ExplicitUic5 = ExplicitUic5
 
     # Interface builder
     uic5builder = Builder(
-        action = SCons.Action.Action('$QT5_UICCOM', '$QT5_UICCOMSTR'),
+        action = SCons.Action.CommandGeneratorAction(__uic_generator, {'cmdstr':'$QT5_UICCOMSTR'}),
+        emitter = _precious_emitter,
         src_suffix='$QT5_UISUFFIX',
         suffix='$QT5_UICDECLSUFFIX',
         prefix='$QT5_UICDECLPREFIX',
@@ -807,7 +1620,7 @@ def generate(env):
     env['BUILDERS']['Uic5'] = uic5builder
 
     # Metaobject builder
-    mocBld = Builder(action={}, prefix={}, suffix={})
+    mocBld = Builder(action={}, prefix={}, suffix={}, emitter=_precious_emitter)
     for h in header_extensions:
         act = SCons.Action.CommandGeneratorAction(__moc_generator_from_h, {'cmdstr':'$QT5_MOCCOMSTR'})    
         mocBld.add_action(h, act)
@@ -822,7 +1635,7 @@ def generate(env):
 
     # Metaobject builder for the extended auto scan feature 
     # (Strategy #1 for qtsolutions)
-    xMocBld = Builder(action={}, prefix={}, suffix={})
+    xMocBld = Builder(action={}, prefix={}, suffix={}, emitter=_precious_emitter)
     for h in header_extensions:
         act = SCons.Action.CommandGeneratorAction(__mocx_generator_from_h, {'cmdstr':'$QT5_MOCCOMSTR'})
         xMocBld.add_action(h, act)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Grouping of sources into unity (jumbo) translation units.
+
+The Unity feature compiles the sources of a directory in batches: each batch
+is a generated .cpp file that #includes its members, so the Qt headers they
+share are parsed once per batch instead of once per file.
+
+Merging only works if the members don't redefine each other's file local
+names. scan_source() collects the names a source defines with internal
+linkage (anonymous namespaces, static and const definitions at namespace
+scope, macros) and make_batches() never puts two sources defining the same
+name into one batch. Sources that can't be merged at all are compiled on
+their own:
+  - sources with a Q_OBJECT or a moc file include, since automoc expects a
+    moc file to be included by the source it belongs to,
+  - sources that #undef something, since the following members would see
+    the undefined macro,
+  - sources that #define something before their first #include, since the
+    headers were already included by the preceding members.
+"""
+
+import io
+import os
+import re
+
+LITERAL_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.S)
+DIRECTIVE_RE = re.compile(r'^\s*#\s*(\w+)\s*(\w*)(?:[^\n]*\\\n)*[^\n]*', re.M)
+MOC_INCLUDE_RE = re.compile(r'^\s*#\s*include\s+["<](moc_[^">]+|[^">]+\.moc)[">]',
+                            re.M)
+QOBJECT_RE = re.compile(r'\bQ_OBJECT\b')
+TEMPLATE_RE = re.compile(r'^template\s*<[^;{]*?>\s*')
+TYPE_RE = re.compile(r'\b(?:class|struct|union|enum(?:\s+class)?)\s+(\w+)')
+MACRO_CALL_RE = re.compile(r'^([A-Z][A-Z0-9_]+)\s*\((.*)\)$', re.S)
+NAME_RE = re.compile(r'(::)?\s*(~?\w+)\s*$')
+
+
+def strip_literals(text):
+    def replace(match):
+        token = match.group(0)
+        if token.startswith('/'):
+            # Keep the newlines, directives are matched per line.
+            return ' ' + '\n' * token.count('\n')
+        return token[0] * 2
+    return LITERAL_RE.sub(replace, text)
+
+
+def declared_name(statement, local):
+    """statement is a declaration or the head of a definition at namespace
+    scope. Returns the name it defines if that name has internal linkage,
+    None otherwise."""
+    statement = TEMPLATE_RE.sub('', ' '.join(statement.split()))
+    if not statement or statement.startswith(('using namespace', 'extern',
+                                              'friend')):
+        return None
+    macro_call = MACRO_CALL_RE.match(statement)
+    if macro_call:
+        # Q_DECLARE_METATYPE(Foo) and the like must not be repeated either.
+        return '%s(%s)' % (macro_call.group(1),
+                           ''.join(macro_call.group(2).split()))
+    if statement.startswith('using ') and '=' in statement:
+        name = statement[len('using '):statement.index('=')].strip()
+        return name if local else None
+    match = TYPE_RE.search(statement)
+    if match and '(' not in statement[:match.start()]:
+        return match.group(1) if local else None
+    head = re.split(r'[=(\[{]', statement, 1)[0]
+    match = NAME_RE.search(head)
+    if not match or match.group(1):
+        # A qualified name defines a member or something declared elsewhere.
+        return None
+    if not local:
+        prefix = head[:match.start()]
+        local = (statement.startswith('static ') or
+                 re.search(r'\b(const|constexpr)\b', prefix) is not None)
+    return match.group(2) if local else None
+
+
+def is_moc_include(name):
+    return name.startswith('moc_') or name.endswith('.moc')
+
+
+def scan_source(path, graph=None):
+    """Returns (names, reason). names is the set of file local names path
+    defines. reason is why path can't be merged with other sources, or
+    None. If graph, the include graph of the qt5 tool, is given, the
+    Q_OBJECT macros and includes are taken from it."""
+    if graph is not None:
+        qobject, _, quoted_includes, system_includes = graph.scan(path)
+        if qobject:
+            return set(), 'Q_OBJECT'
+        if any(is_moc_include(name)
+               for name in quoted_includes + system_includes):
+            return set(), 'includes a moc file'
+    with io.open(path, encoding='utf-8', errors='replace') as f:
+        text = strip_literals(f.read())
+    if graph is None:
+        if QOBJECT_RE.search(text):
+            return set(), 'Q_OBJECT'
+        if MOC_INCLUDE_RE.search(text):
+            return set(), 'includes a moc file'
+
+    names = set()
+    seen_include = False
+    for match in DIRECTIVE_RE.finditer(text):
+        directive, name = match.group(1), match.group(2)
+        if directive == 'include':
+            seen_include = True
+        elif directive == 'undef':
+            return set(), '#undef %s' % name
+        elif directive == 'define':
+            if not seen_include:
+                return set(), '#define %s before the includes' % name
+            names.add(name)
+    text = DIRECTIVE_RE.sub('', text)
+
+    # Scopes enclosing the current position: 'anonymous', 'namespace' (named
+    # namespaces and extern "C") or 'block' (anything else).
+    scopes = []
+    start = 0
+    for match in re.finditer(r'[{};]', text):
+        statement = text[start:match.start()].strip()
+        start = match.end()
+        delimiter = match.group(0)
+        at_namespace_scope = 'block' not in scopes
+        if delimiter == '}':
+            if scopes:
+                scopes.pop()
+            continue
+        if at_namespace_scope:
+            name = declared_name(statement, 'anonymous' in scopes)
+            if name is not None:
+                names.add(name)
+        if delimiter == '{':
+            if re.search(r'\bnamespace\s*$', statement):
+                scopes.append('anonymous')
+            elif (re.search(r'\bnamespace\s+[\w:]+\s*$', statement) or
+                  re.search(r'\bextern\s*""\s*$', statement)):
+                scopes.append('namespace')
+            else:
+                scopes.append('block')
+    return names, None
+
+
+def make_batches(src_dir, paths, size, graph=None):
+    """Groups paths, relative to src_dir, into batches of at most size
+    sources of the same directory. Returns (batches, excluded) where
+    batches is a list of (name, paths) and excluded maps the paths that
+    have to be compiled on their own to the reason."""
+    by_directory = {}
+    excluded = {}
+    for path in paths:
+        names, reason = scan_source(os.path.join(src_dir, path), graph)
+        if reason is not None:
+            excluded[path] = reason
+            continue
+        by_directory.setdefault(os.path.dirname(path), []).append(
+            (path, names))
+
+    batches = []
+    for directory in sorted(by_directory):
+        # Each source goes into the first batch it doesn't clash with.
+        directory_batches = []
+        for path, names in sorted(by_directory[directory]):
+            for batch_paths, batch_names in directory_batches:
+                if len(batch_paths) < size and not names & batch_names:
+                    batch_paths.append(path)
+                    batch_names.update(names)
+                    break
+            else:
+                directory_batches.append(([path], set(names)))
+        prefix = directory.replace('/', '_').replace('\\', '_') or 'src'
+        for index, (batch_paths, _) in enumerate(directory_batches):
+            batches.append(('%s_%d.cpp' % (prefix, index + 1), batch_paths))
+    return batches, excluded
+
+
+def get_unity_source(paths):
+    lines = ['// Generated by the unity build. Do not edit.']
+    lines.extend('#include "%s"' % path.replace('\\', '/') for path in paths)
+    return '\n'.join(lines) + '\n'
@@ -1,8 +1,14 @@
 from SCons import Script
+import glob
+import hashlib
 import os
 import os.path
+import pickle
 import re
 import stat
+import subprocess
+import threading
+import time
 
 CURRENT_VCS = None
 
@@ -70,26 +76,116 @@ def export_source(source, dest):
     return None
 
 
+GIT_METADATA = None
+
+
+def find_git_dir(path):
+    """Returns the git directory of the checkout containing path or None."""
+    while True:
+        candidate = os.path.join(path, '.git')
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # Worktrees and submodules use a .git file pointing elsewhere.
+            with open(candidate) as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                return os.path.join(path, line[len('gitdir:'):].strip())
+        path, basename = os.path.split(path)
+        if not basename:
+            return None
+
+
+def get_git_head_key(git_dir):
+    """Returns a key that changes whenever HEAD points to another commit."""
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    with open(os.path.join(git_dir, 'HEAD')) as f:
+        head = f.read().strip()
+    key = [head]
+    paths = [os.path.join(common_dir, 'packed-refs')]
+    if head.startswith('ref:'):
+        paths.append(os.path.join(common_dir, head[len('ref:'):].strip()))
+    for path in paths:
+        key.append(os.path.getmtime(path) if os.path.exists(path) else None)
+    return key
+
+
+def get_git_metadata():
+    """Returns a dictionary with the branch name, revision and modified files
+    of the git checkout.
+
+    Branch and modified files come from a single porcelain 'git status' call.
+    The revision is counted with 'git rev-list --count' and persisted in
+    cache/vcs.cache, keyed on the state of HEAD, since it is the expensive
+    part on a long history. Everything is queried at most once per process.
+    """
+    global GIT_METADATA
+    if GIT_METADATA is not None:
+        return GIT_METADATA
+
+    branch_name = ''
+    modified_files = []
+    status = os.popen('git status --porcelain --branch --untracked-files=no')
+    for line in status.read().splitlines():
+        if line.startswith('## '):
+            # e.g. "## master...origin/master [ahead 1]", "## HEAD (no
+            # branch)" or "## No commits yet on master"
+            branch_name = line[3:].split('...')[0].split(' [')[0]
+            for prefix in ('No commits yet on ', 'Initial commit on '):
+                if branch_name.startswith(prefix):
+                    branch_name = branch_name[len(prefix):]
+            if branch_name.startswith('HEAD'):
+                branch_name = 'HEAD'
+        elif len(line) > 3:
+            modified_files.append(line[3:].split(' -> ')[-1].strip())
+    status.close()
+
+    revision = None
+    cache_file = None
+    head_key = None
+    git_dir = find_git_dir(os.getcwd())
+    cache_dir = Script.Dir('#cache').abspath
+    if git_dir is not None and os.path.isdir(cache_dir):
+        cache_file = os.path.join(cache_dir, 'vcs.cache')
+        try:
+            head_key = get_git_head_key(git_dir)
+            with open(cache_file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('head') == head_key:
+                revision = cache['revision']
+        except Exception:
+            pass
+    if revision is None:
+        output = os.popen('git rev-list --count --first-parent HEAD').read()
+        revision = int(output.strip() or 0)
+        if cache_file is not None and head_key is not None:
+            try:
+                with open(cache_file, 'wb') as f:
+                    pickle.dump({'head': head_key, 'revision': revision}, f, 2)
+            except (IOError, OSError):
+                pass
+
+    GIT_METADATA = {'branch_name': branch_name,
+                    'revision': revision,
+                    'modified': "\n".join(modified_files)}
+    return GIT_METADATA
+
+
 def get_git_revision():
-    return len(os.popen("git log --pretty=oneline --first-parent").read().splitlines())
+    return get_git_metadata()['revision']
 
 
 def get_git_modified():
-    modified_matcher = re.compile(
-        "^#.*:   (?P<filename>.*?)$")  # note output might be translated
-    modified_files = []
-    for line in os.popen("git status").read().splitlines():
-        match = modified_matcher.match(line)
-        if match:
-            match = match.groupdict()
-            modified_files.append(match['filename'].strip())
-    return "\n".join(modified_files)
+    return get_git_metadata()['modified']
 
 
 def get_git_branch_name():
     # this returns the branch name or 'HEAD' in case of detached HEAD
-    branch_name = os.popen(
-        "git rev-parse --abbrev-ref HEAD").readline().strip()
+    branch_name = get_git_metadata()['branch_name']
     if branch_name == 'HEAD':
         # Use APPVEYOR_REPO_BRANCH variable if building on appveyor or (no branch) if unset
         branch_name = os.getenv("APPVEYOR_REPO_BRANCH", '(no branch)')
@@ -167,30 +263,581 @@ def CheckForPKGConfig(context, version='0.0.0'):
 def CheckForPKG(context, name, version=""):
     if version == "":
         context.Message("Checking for %s... \t" % name)
-        ret = context.TryAction("pkg-config --exists '%s'" % name)[0]
     else:
         context.Message(
             "Checking for %s (%s or higher)... \t" % (name, version))
-        ret = context.TryAction(
-            "pkg-config --atleast-version=%s '%s'" % (version, name))[0]
-        context.Result(ret)
+    installed_version = get_pkg_config().version(name)
+    ret = installed_version is not None and (
+        version == "" or compare_versions(installed_version, version) >= 0)
+    context.Result(ret)
     return ret
 
 
+class PkgConfig(object):
+    """A memoizing front-end for pkg-config.
+
+    The installed packages and their versions are queried with one batched
+    pkg-config call, the flags and variables of a package once per package.
+    All results are kept in memory and in cache_file. The file is invalidated
+    when the pkg-config search path or any .pc file in it changes.
+    """
+
+    # Environment variables that change what pkg-config reports.
+    ENVIRONMENT_VARIABLES = ['PKG_CONFIG_PATH', 'PKG_CONFIG_LIBDIR',
+                             'PKG_CONFIG_SYSROOT_DIR']
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._key = None
+        self._results = {}
+
+    def _run(self, args):
+        try:
+            process = subprocess.Popen(['pkg-config'] + list(args),
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+        except OSError:
+            return 127, ''
+        output = process.communicate()[0]
+        return process.returncode, output.decode('utf-8', 'replace').strip()
+
+    def _environment_key(self):
+        binary = None
+        for path in os.environ.get('PATH', '').split(os.pathsep):
+            candidate = os.path.join(path, 'pkg-config')
+            if os.access(candidate, os.X_OK):
+                binary = (candidate, os.path.getmtime(candidate))
+                break
+        return (binary, [os.environ.get(name)
+                         for name in self.ENVIRONMENT_VARIABLES])
+
+    def _search_path_key(self, search_path):
+        # Adding, removing or editing a .pc file changes the mtime of the file
+        # or of its directory.
+        key = []
+        for directory in search_path.split(os.pathsep):
+            try:
+                key.append((directory, os.path.getmtime(directory)))
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith('.pc'):
+                        pc_file = os.path.join(directory, name)
+                        key.append((name, os.path.getmtime(pc_file)))
+            except OSError:
+                continue
+        return key
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        environment_key = self._environment_key()
+        cache = None
+        if self.cache_file is not None:
+            try:
+                with open(self.cache_file, 'rb') as f:
+                    cache = pickle.load(f)
+            except Exception:
+                cache = None
+        if (isinstance(cache, dict) and
+                cache.get('environment') == environment_key):
+            search_path = cache['search_path']
+        else:
+            cache = None
+            search_path = os.environ.get('PKG_CONFIG_PATH', '')
+            libdir = os.environ.get('PKG_CONFIG_LIBDIR')
+            if libdir is None:
+                libdir = self._run(
+                    ['--variable', 'pc_path', 'pkg-config'])[1]
+            search_path = os.pathsep.join(
+                [path for path in (search_path, libdir) if path])
+        self._key = {'environment': environment_key,
+                     'search_path': search_path,
+                     'files': self._search_path_key(search_path)}
+        if cache is not None and cache.get('files') == self._key['files']:
+            self._results = cache['results']
+        else:
+            self._dirty = True
+
+    def save(self):
+        """Writes the memoized results to cache_file if they changed."""
+        with self._lock:
+            if not self._dirty or self.cache_file is None:
+                return
+            cache = dict(self._key, results=self._results)
+            self._dirty = False
+        try:
+            write_atomically(self.cache_file, pickle.dumps(cache, 2))
+        except (IOError, OSError):
+            pass
+
+    def _get(self, key, query, nested=False):
+        # Nested lookups, like the package list every query checks first,
+        # only count when they run pkg-config.
+        with self._lock:
+            self._load()
+            if key in self._results:
+                if not nested:
+                    self.hits += 1
+                return self._results[key]
+        value = query()
+        with self._lock:
+            self.misses += 1
+            self._results[key] = value
+            self._dirty = True
+        return value
+
+    def _query_packages(self):
+        code, output = self._run(['--list-all'])
+        if code != 0:
+            return frozenset()
+        return frozenset(line.split()[0] for line in output.splitlines()
+                         if line.strip())
+
+    def packages(self):
+        """Returns the names of all installed packages."""
+        return self._get(('list-all',), self._query_packages)
+
+    def _installed(self, package):
+        return package in self._get(('list-all',), self._query_packages,
+                                    nested=True)
+
+    def version(self, package):
+        """Returns the version of package or None if it is not installed."""
+        def query():
+            if not self._installed(package):
+                return None
+            code, output = self._run(['--modversion', package])
+            return output if code == 0 else None
+        return self._get(('version', package), query)
+
+    def flags(self, package):
+        """Returns the --cflags --libs output of package or None."""
+        def query():
+            if not self._installed(package):
+                return None
+            code, output = self._run(
+                ['--silence-errors', '--cflags', '--libs', package])
+            return output if code == 0 else None
+        return self._get(('flags', package), query)
+
+    def variable(self, package, name):
+        """Returns the value of variable name of package or None."""
+        def query():
+            if not self._installed(package):
+                return None
+            code, output = self._run(['--variable=%s' % name, package])
+            return output if code == 0 else None
+        return self._get(('variable', package, name), query)
+
+    def prefetch(self, packages, jobs=1):
+        """Queries the versions of packages with one batched pkg-config call
+        and their flags with a pool of jobs threads."""
+        installed = self._get(('list-all',), self._query_packages, nested=True)
+        with self._lock:
+            packages = sorted(package for package in set(packages)
+                              if package in installed and
+                              ('flags', package) not in self._results)
+            missing_versions = [package for package in packages
+                                if ('version', package) not in self._results]
+        if missing_versions:
+            code, output = self._run(['--modversion'] + missing_versions)
+            versions = output.splitlines()
+            if code == 0 and len(versions) == len(missing_versions):
+                with self._lock:
+                    for package, version in zip(missing_versions, versions):
+                        self._results[('version', package)] = version.strip()
+                    self.misses += 1
+                    self._dirty = True
+        if jobs < 2 or len(packages) < 2:
+            for package in packages:
+                self.flags(package)
+            return
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(packages)))
+        try:
+            pool.map(self.flags, packages)
+        finally:
+            pool.close()
+            pool.join()
+
+
+PKG_CONFIG = None
+
+
+def get_pkg_config():
+    """Returns the PkgConfig instance shared by all configure checks."""
+    global PKG_CONFIG
+    if PKG_CONFIG is None:
+        PKG_CONFIG = PkgConfig(
+            os.path.join(Script.Dir('#cache').abspath, 'pkgconfig.cache'))
+    return PKG_CONFIG
+
+
+def parse_pkg_config(env, *packages):
+    """Merges the pkg-config flags of packages into env. This is equivalent to
+    env.ParseConfig('pkg-config <packages> --cflags --libs') but uses the
+    memoized results."""
+    for package in packages:
+        flags = get_pkg_config().flags(package)
+        if flags is None:
+            raise OSError("'pkg-config %s --cflags --libs' failed" % package)
+        env.MergeFlags(flags)
+
+
+def compare_versions(version, other):
+    """Compares two version strings like pkg-config does. Returns a negative
+    number, zero or a positive number if version is older, equal or newer
+    than other."""
+    parts = re.findall(r'\d+|[a-zA-Z]+', version)
+    other_parts = re.findall(r'\d+|[a-zA-Z]+', other)
+    for part, other_part in zip(parts, other_parts):
+        if part.isdigit() != other_part.isdigit():
+            # Numeric segments are newer than alphabetic ones.
+            return 1 if part.isdigit() else -1
+        if part.isdigit():
+            part, other_part = int(part), int(other_part)
+        if part != other_part:
+            return -1 if part < other_part else 1
+    return len(parts) - len(other_parts)
+
+
 def write_build_header(path):
+    branch_name, revision = get_build_info()
     f = open(path, 'w')
     try:
-        branch_name = get_branch_name()
-        modified = len(get_modified()) > 0
-        # Do not emit BUILD_BRANCH on release branches.
-        if branch_name and not branch_name.startswith('release'):
+        if branch_name is not None:
             f.write('#define BUILD_BRANCH "%s"\n' % branch_name)
-        f.write('#define BUILD_REV "%s%s"\n' % (get_revision(),
-                                                '+' if modified else ''))
+        f.write('#define BUILD_REV "%s"\n' % revision)
     finally:
         f.close()
         os.chmod(path, stat.S_IRWXU | stat.S_IRWXG |stat.S_IRWXO)
 
+
+def read_build_header(path):
+    """Returns the BUILD_BRANCH and BUILD_REV defined in the build.h at path,
+    as written by write_build_header, or None for the missing ones."""
+    defines = {}
+    define_re = re.compile(r'^#define (BUILD_BRANCH|BUILD_REV) "(.*)"$')
+    with open(path) as f:
+        for line in f:
+            match = define_re.match(line.strip())
+            if match:
+                defines[match.group(1)] = match.group(2)
+    return defines.get('BUILD_BRANCH'), defines.get('BUILD_REV')
+
+
+def get_build_info():
+    """Returns the branch (None on release branches) and the revision to
+    show in the version info."""
+    branch_name = get_branch_name()
+    modified = len(get_modified()) > 0
+    # Do not emit BUILD_BRANCH on release branches.
+    if not branch_name or branch_name.startswith('release'):
+        branch_name = None
+    return branch_name, '%s%s' % (get_revision(), '+' if modified else '')
+
+
+def cpp_string_literal(value):
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def get_build_info_source(branch_name, revision):
+    """Returns the C++ source defining the Version methods that change with
+    every commit. Keeping them out of build.h means a new revision only
+    recompiles this file instead of everything including build.h."""
+    lines = ['// Generated by SCons. Do not edit.',
+             '#include "util/version.h"',
+             '',
+             '// static',
+             'QString Version::developmentBranch() {']
+    if branch_name is None:
+        lines.append('    return QString();')
+    else:
+        lines.append('    return QString(%s);' % cpp_string_literal(branch_name))
+    lines.extend(['}',
+                  '',
+                  '// static',
+                  'QString Version::developmentRevision() {'])
+    if revision is None:
+        lines.append('    return QString();')
+    else:
+        lines.append('    return QString(%s);' % cpp_string_literal(revision))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_value(target, source, env):
+    """SCons action writing the contents of the Value source[0] to
+    target[0]."""
+    with open(str(target[0]), 'w') as f:
+        f.write(source[0].read())
+
+
+def write_atomically(path, data, mode='wb'):
+    """Writes data to path through a temporary file, so that nothing ever
+    reads a partially written file. Parallel writers each use their own
+    temporary file, including the job threads of scons -j."""
+    temp_path = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                  threading.current_thread().ident)
+    with open(temp_path, mode) as f:
+        f.write(data)
+    # os.rename doesn't replace an existing file on Windows.
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(temp_path, path)
+
+
+def write_if_changed(path, contents, binary=False):
+    """Writes contents to path unless it already has exactly these contents,
+    so that the file's mtime and anything depending on it stay untouched.
+    Returns whether the file was written."""
+    mode = 'b' if binary else ''
+    try:
+        with open(path, 'r' + mode) as f:
+            if f.read() == contents:
+                return False
+    except (IOError, OSError):
+        pass
+    write_atomically(path, contents, 'w' + mode)
+    return True
+
+
+def get_source_paths(env, sources):
+    """Returns the absolute paths of the C and C++ files in sources, a list of
+    file names and nodes as collected by SConscript.env."""
+    paths = []
+    for source in Script.Flatten(sources):
+        node = env.File(source) if isinstance(source, str) else source
+        # Objects of the unity build stand for the sources they merge.
+        unity_sources = getattr(node.attributes, 'unity_sources', None)
+        if unity_sources:
+            paths.extend(cpp.srcnode().abspath for cpp in unity_sources)
+            continue
+        # Object nodes, e.g. the ones built by FpClassify.
+        if node.has_builder() and node.sources and \
+                not node.get_suffix() in ('.c', '.cc', '.cpp'):
+            node = node.sources[0]
+        if node.get_suffix() in ('.c', '.cc', '.cpp'):
+            paths.append(node.srcnode().abspath)
+    return paths
+
+
+def get_include_dirs(env):
+    """Returns the absolute source paths of the directories in CPPPATH."""
+    include_dirs = []
+    for path in Script.Flatten(env['CPPPATH']):
+        if isinstance(path, str) and '$' in path:
+            path = env.subst(path)
+        include_dirs.append(env.Dir(path).srcnode().abspath)
+    return include_dirs
+
+
+QUOTED_INCLUDE_RE = re.compile(r'^\s*#\s*include\s*"([^"]+)"', re.M)
+
+
+def get_include_graph(env):
+    """Returns the include graph the qt5 tool shares with automoc, or None if
+    env doesn't use the qt5 tool."""
+    if hasattr(env, 'IncludeGraph'):
+        return env.IncludeGraph()
+    return None
+
+
+def find_includers(paths, header, include_dirs, graph=None):
+    """Returns the files in paths that include header (as spelled in the
+    #include directive) directly or through other headers. Only quoted
+    includes are followed. They are looked up next to the including file and
+    in include_dirs."""
+    return group_includers(paths, [header], include_dirs, graph)[header]
+
+
+def group_includers(paths, headers, include_dirs, graph=None):
+    """Like find_includers, for several headers at once. Returns a dictionary
+    from each of headers to the files in paths that include it. The includes
+    are taken from graph, see get_include_graph, if it is given."""
+    if graph is not None:
+        return graph.includers(paths, headers, include_dirs)
+    headers = set(headers)
+    includes = {}
+
+    def get_includes(path):
+        if path not in includes:
+            includes[path] = []
+            try:
+                with open(path) as f:
+                    contents = f.read()
+            except (IOError, OSError):
+                return includes[path]
+            directory = os.path.dirname(path)
+            for name in QUOTED_INCLUDE_RE.findall(contents):
+                resolved = name
+                for include_dir in [directory] + include_dirs:
+                    candidate = os.path.join(include_dir, name)
+                    if os.path.isfile(candidate):
+                        resolved = os.path.normpath(candidate)
+                        break
+                includes[path].append((name, resolved))
+        return includes[path]
+
+    included_headers = {}
+
+    def check(path):
+        if path not in included_headers:
+            # Guard against include cycles.
+            included_headers[path] = frozenset()
+            found = set()
+            for name, resolved in get_includes(path):
+                if name in headers:
+                    found.add(name)
+                found.update(check(resolved))
+            included_headers[path] = frozenset(found)
+        return included_headers[path]
+
+    includers = dict((header, []) for header in headers)
+    for path in paths:
+        for header in check(path):
+            includers[header].append(path)
+    return includers
+
+
+# Environment variables that influence the result of the configure checks,
+# see MixxxBuild.read_environment_variables.
+CONFIGURE_ENVIRONMENT_VARIABLES = ['CC', 'CFLAGS', 'CXX', 'CXXFLAGS', 'LDFLAGS',
+                                   'LIBDIR', 'BINDIR', 'SHAREDIR', 'PATH',
+                                   'PKG_CONFIG_PATH', 'QTDIR']
+
+
+def get_configure_cache_key(build):
+    """Returns a digest of everything the dependency configuration depends
+    on: the toolchain, the environment variables we read, the command line
+    and cached build flags and the build scripts themselves."""
+    digest = hashlib.sha1()
+
+    def update(value):
+        digest.update(repr(value).encode('utf-8'))
+
+    update([build.platform, build.machine, build.build, build.toolchain,
+            build.env['CC'], build.env['CXX'], build.env.get('QTDIR')])
+    for name in CONFIGURE_ENVIRONMENT_VARIABLES:
+        update((name, os.environ.get(name)))
+    update(sorted(Script.ARGUMENTS.items()))
+
+    custom_file = os.path.join(Script.Dir('#cache').abspath, 'custom.py')
+    if os.path.isfile(custom_file):
+        with open(custom_file, 'rb') as f:
+            digest.update(f.read())
+
+    scripts = glob.glob(os.path.join(Script.Dir('#build').abspath, '*.py'))
+    scripts.append(Script.File('#SConstruct').abspath)
+    scripts.append(Script.File('#src/SConscript.env').abspath)
+    for script in sorted(scripts):
+        update((os.path.basename(script), os.path.getmtime(script)))
+    return digest.hexdigest()
+
+
+def snapshot_env(env):
+    """Returns a dictionary of the pickled values of all picklable
+    construction variables, for use with get_env_changes."""
+    snapshot = {}
+    for key, value in env.Dictionary().items():
+        try:
+            snapshot[key] = pickle.dumps(value, 2)
+        except Exception:
+            snapshot[key] = None
+    return snapshot
+
+
+def get_env_changes(env, snapshot):
+    """Returns the construction variables that were added or changed since
+    snapshot was taken. Raises ValueError if a changed variable can't be
+    pickled."""
+    changes = {}
+    for key, value in env.Dictionary().items():
+        try:
+            pickled = pickle.dumps(value, 2)
+        except Exception:
+            if key in snapshot and snapshot[key] is None:
+                # Not picklable before either, assume it's not ours.
+                continue
+            raise ValueError('%s can not be cached' % key)
+        if snapshot.get(key) != pickled:
+            changes[key] = value
+    return changes
+
+
+def load_configure_cache(path, key):
+    """Returns the cached configure results stored for key or None."""
+    try:
+        with open(path, 'rb') as f:
+            cache = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cache, dict) or cache.get('key') != key:
+        return None
+    return cache
+
+
+def save_configure_cache(path, key, cache):
+    cache = dict(cache, key=key)
+    write_atomically(path, pickle.dumps(cache, 2))
+
+
+def get_compiled_source(args):
+    """Returns the source file compiled by the command line args, or None if
+    args doesn't compile a single C or C++ source."""
+    if '-c' not in args:
+        return None
+    sources = [arg for arg in args[1:] if not arg.startswith('-') and
+               os.path.splitext(arg)[1] in ('.c', '.cc', '.cpp', '.cxx')]
+    if len(sources) != 1:
+        return None
+    return sources[0]
+
+
+def get_linked_target(args):
+    """Returns the program or library linked by the command line args, or None
+    if args doesn't link object files."""
+    if '-c' in args or '-o' not in args[:-1]:
+        return None
+    if not any(os.path.splitext(arg)[1] in ('.o', '.os', '.a')
+               for arg in args[1:]):
+        return None
+    return args[args.index('-o') + 1]
+
+
+class CompileTimer(object):
+    """A SPAWN function that records how long each compile takes, and how long
+    each link takes together with the size of its output."""
+
+    def __init__(self, spawn):
+        self.spawn = spawn
+        self.times = {}
+        self.link_times = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, sh, escape, cmd, args, env):
+        start_time = time.time()
+        result = self.spawn(sh, escape, cmd, args, env)
+        if result != 0:
+            return result
+        source = get_compiled_source(args)
+        if source is not None:
+            with self.lock:
+                self.times[source] = time.time() - start_time
+            return result
+        target = get_linked_target(args)
+        if target is not None and os.path.isfile(target):
+            with self.lock:
+                self.link_times[target] = (time.time() - start_time,
+                                           os.path.getsize(target))
+        return result
+
+
 def get_osx_min_version():
     """Gets the minimum required OS X version from product_definition.plist."""
     # Mixxx 2.0 supported OS X 10.6 and up.
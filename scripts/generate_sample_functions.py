@@ -44,6 +44,7 @@ def write_channelmixer_autogen(output, num_channels):
                 'CSAMPLE* pOutput', 'const ChannelHandle& outputHandle',
                 'unsigned int iBufferSize', 'unsigned int iSampleRate',
                 'EngineEffectsManager* pEngineEffectsManager']
+        output.append('MIXXX_TARGET_CLONES')
         output.extend(hanging_indent(header, args, ',', ') {'))
 
         def write(data, depth=0):
@@ -7,6 +7,7 @@
 ////////////////////////////////////////////////////////
 
 // static
+MIXXX_TARGET_CLONES
 void ChannelMixer::applyEffectsAndMixChannels(const EngineMaster::GainCalculator& gainCalculator,
                                               QVarLengthArray<EngineMaster::ChannelInfo*, kPreallocatedChannels>* activeChannels,
                                               QVarLengthArray<EngineMaster::GainCache, kPreallocatedChannels>* channelGainCache,
@@ -7072,6 +7073,7 @@ void ChannelMixer::applyEffectsAndMixChannels(const EngineMaster::GainCalculator
         }
     }
 }
+MIXXX_TARGET_CLONES
 void ChannelMixer::applyEffectsInPlaceAndMixChannels(const EngineMaster::GainCalculator& gainCalculator,
                                                      QVarLengthArray<EngineMaster::ChannelInfo*, kPreallocatedChannels>* activeChannels,
                                                      QVarLengthArray<EngineMaster::GainCache, kPreallocatedChannels>* channelGainCache,
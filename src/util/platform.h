@@ -35,4 +35,16 @@
   } while (0)
 #endif
 
+// MIXXX_TARGET_CLONES compiles a function once per listed x86 instruction set
+// and lets the dynamic loader pick the best one for the CPU at startup (GNU
+// ifunc), so portable builds still use AVX in the vectorized sample loops.
+// Enabled with scons multiversion=1.
+#if defined(MIXXX_MULTIVERSION) && defined(__GNUC__) && \
+        defined(__x86_64__) && defined(__linux__)
+#define MIXXX_TARGET_CLONES \
+  __attribute__((target_clones("avx2", "avx", "default")))
+#else
+#define MIXXX_TARGET_CLONES
+#endif
+
 #endif /* MIXXX_UTIL_PLATFORM_H */
@@ -90,6 +90,7 @@ void SampleUtil::free(CSAMPLE* pBuffer) {
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::applyGain(CSAMPLE* pBuffer, CSAMPLE_GAIN gain,
         SINT numSamples) {
     if (gain == CSAMPLE_GAIN_ONE)
@@ -106,6 +107,7 @@ void SampleUtil::applyGain(CSAMPLE* pBuffer, CSAMPLE_GAIN gain,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::applyRampingGain(CSAMPLE* pBuffer, CSAMPLE_GAIN old_gain,
         CSAMPLE_GAIN new_gain, SINT numSamples) {
     if (old_gain == CSAMPLE_GAIN_ONE && new_gain == CSAMPLE_GAIN_ONE) {
@@ -136,6 +138,7 @@ void SampleUtil::applyRampingGain(CSAMPLE* pBuffer, CSAMPLE_GAIN old_gain,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::applyAlternatingGain(CSAMPLE* pBuffer, CSAMPLE gain1,
         CSAMPLE gain2, SINT numSamples) {
     // This handles gain1 == CSAMPLE_GAIN_ONE && gain2 == CSAMPLE_GAIN_ONE as well.
@@ -193,6 +196,7 @@ void SampleUtil::applyRampingAlternatingGain(CSAMPLE* pBuffer,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::add(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc,
         SINT numSamples) {
@@ -203,6 +207,7 @@ void SampleUtil::add(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::addWithGain(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc,
         CSAMPLE_GAIN gain, SINT numSamples) {
@@ -216,6 +221,7 @@ void SampleUtil::addWithGain(CSAMPLE* M_RESTRICT pDest,
     }
 }
 
+MIXXX_TARGET_CLONES
 void SampleUtil::addWithRampingGain(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc,
         CSAMPLE_GAIN old_gain, CSAMPLE_GAIN new_gain,
@@ -243,6 +249,7 @@ void SampleUtil::addWithRampingGain(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::add2WithGain(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc1, CSAMPLE_GAIN gain1,
         const CSAMPLE* M_RESTRICT pSrc2, CSAMPLE_GAIN gain2,
@@ -260,6 +267,7 @@ void SampleUtil::add2WithGain(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::add3WithGain(CSAMPLE* pDest,
         const CSAMPLE* M_RESTRICT pSrc1, CSAMPLE_GAIN gain1,
         const CSAMPLE* M_RESTRICT pSrc2, CSAMPLE_GAIN gain2,
@@ -280,6 +288,7 @@ void SampleUtil::add3WithGain(CSAMPLE* pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::copyWithGain(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc,
         CSAMPLE_GAIN gain, SINT numSamples) {
@@ -303,6 +312,7 @@ void SampleUtil::copyWithGain(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::copyWithRampingGain(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc,
         CSAMPLE_GAIN old_gain,
@@ -340,6 +350,7 @@ void SampleUtil::copyWithRampingGain(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::convertS16ToFloat32(CSAMPLE* M_RESTRICT pDest,
         const SAMPLE* M_RESTRICT pSrc, SINT numSamples) {
     // SAMPLE_MIN = -32768 is a valid low sample, whereas SAMPLE_MAX = 32767
@@ -354,6 +365,7 @@ void SampleUtil::convertS16ToFloat32(CSAMPLE* M_RESTRICT pDest,
 }
 
 //static
+MIXXX_TARGET_CLONES
 void SampleUtil::convertFloat32ToS16(SAMPLE* pDest, const CSAMPLE* pSrc,
         SINT numSamples) {
     DEBUG_ASSERT(-SAMPLE_MIN >= SAMPLE_MAX);
@@ -365,6 +377,7 @@ void SampleUtil::convertFloat32ToS16(SAMPLE* pDest, const CSAMPLE* pSrc,
 }
 
 // static
+MIXXX_TARGET_CLONES
 SampleUtil::CLIP_STATUS SampleUtil::sumAbsPerChannel(CSAMPLE* pfAbsL,
         CSAMPLE* pfAbsR, const CSAMPLE* pBuffer, SINT numSamples) {
     CSAMPLE fAbsL = CSAMPLE_ZERO;
@@ -396,6 +409,7 @@ SampleUtil::CLIP_STATUS SampleUtil::sumAbsPerChannel(CSAMPLE* pfAbsL,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::copyClampBuffer(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc, SINT iNumSamples) {
     // note: LOOP VECTORIZED.
@@ -405,6 +419,7 @@ void SampleUtil::copyClampBuffer(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::interleaveBuffer(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc1,
         const CSAMPLE* M_RESTRICT pSrc2,
@@ -417,6 +432,7 @@ void SampleUtil::interleaveBuffer(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::deinterleaveBuffer(CSAMPLE* M_RESTRICT pDest1,
         CSAMPLE* M_RESTRICT pDest2,
         const CSAMPLE* M_RESTRICT pSrc,
@@ -429,6 +445,7 @@ void SampleUtil::deinterleaveBuffer(CSAMPLE* M_RESTRICT pDest1,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::linearCrossfadeBuffers(CSAMPLE* pDest,
         const CSAMPLE* pSrcFadeOut, const CSAMPLE* pSrcFadeIn,
         SINT numSamples) {
@@ -446,6 +463,7 @@ void SampleUtil::linearCrossfadeBuffers(CSAMPLE* pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::mixStereoToMono(CSAMPLE* pDest, const CSAMPLE* pSrc,
         SINT numSamples) {
     const CSAMPLE_GAIN mixScale = CSAMPLE_GAIN_ONE
@@ -470,6 +488,7 @@ void SampleUtil::doubleMonoToDualMono(CSAMPLE* pBuffer, SINT numFrames) {
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::copyMonoToDualMono(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc, SINT numFrames) {
     // forward loop
@@ -482,6 +501,7 @@ void SampleUtil::copyMonoToDualMono(CSAMPLE* M_RESTRICT pDest,
 }
 
 // static
+MIXXX_TARGET_CLONES
 void SampleUtil::addMonoToStereo(CSAMPLE* M_RESTRICT pDest,
         const CSAMPLE* M_RESTRICT pSrc, SINT numFrames) {
     // forward loop
@@ -67,23 +67,8 @@ QString Version::applicationTitle() {
     return base;
 }
 
-// static
-QString Version::developmentBranch() {
-#ifdef BUILD_BRANCH
-    return BUILD_BRANCH;
-#else
-    return QString();
-#endif
-}
-
-// static
-QString Version::developmentRevision() {
-#ifdef BUILD_REV
-    return BUILD_REV;
-#else
-    return QString();
-#endif
-}
+// Version::developmentBranch() and Version::developmentRevision() are defined
+// in buildinfo.cpp, which is generated by SCons.
 
 // static
 QString Version::buildFlags() {